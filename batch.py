@@ -0,0 +1,178 @@
+import argparse
+import glob
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List
+
+from data import VIEWS, TableData, temperature_to_time
+from export import EXPORT_FORMATS, view_tables, write_tables
+from smoothing import SMOOTH_METHODS, SMOOTH_WINDOW
+
+# 批处理时按TableData方法名指定视图, 同一方法只保留第一个 (含量类型, 有机物类型)
+BATCH_VIEWS = dict()
+for _key, (_method, _, _) in VIEWS.items():
+    BATCH_VIEWS.setdefault(_method, _key)
+# 目录中默认处理的文件
+DEFAULT_PATTERN = 'species*'
+# 导出格式 -> 扩展名
+FORMAT_EXTENSIONS = {fmt: ext for ext, fmt in reversed(EXPORT_FORMATS.items())}
+
+
+def find_files(inputs: List[str], pattern=DEFAULT_PATTERN) -> List[str]:
+    """
+    展开输入的文件、目录和通配符
+    :param inputs: 文件路径、目录或通配符
+    :param pattern: 目录中(含子目录)要处理的文件名
+    :return: 去重并排序后的文件路径
+    """
+    files = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            paths = glob.glob(os.path.join(item, '**', pattern), recursive=True)
+        elif glob.has_magic(item):
+            paths = glob.glob(item, recursive=True)
+        else:
+            paths = [item]
+        files.update(os.path.abspath(path) for path in paths if os.path.isfile(path))
+    return sorted(files)
+
+
+def output_prefix(file_path: str, base_dir: str, output_dir=None) -> str:
+    """
+    导出文件名前缀. 不同目录下常有同名的species文件, 指定输出目录时保留相对 base_dir 的目录结构
+    """
+    if output_dir is None:
+        return file_path
+    return os.path.join(output_dir, os.path.relpath(file_path, base_dir))
+
+
+def process_file(file_path, prefix, views, footstep=1, initial_temp=None, heating_rate=None, top_n=None,
+                 rank_by='peak', export_format='xlsx', use_cache=True, combine=False, time_range=None, stride=1,
+                 smooth=None, window=SMOOTH_WINDOW, rate=False, wide='split'):
+    """
+    处理单个文件并导出各视图, 在子进程中执行
+    :param file_path: species文件路径
+    :param prefix: 导出文件名前缀, 导出为 前缀_视图名.格式
+    :param views: 视图(TableData方法名)
+    :param footstep: 步长
+    :param initial_temp: 初始温度, 与升温速率同时给出时以温度为x轴
+    :param heating_rate: 升温速率
+    :param top_n: 只导出排名前N的物种
+    :param rank_by: 物种排序依据
+    :param export_format: xlsx、csv、parquet 或 hdf5
+    :param use_cache: 是否使用磁盘缓存
+    :param combine: 是否把全部视图写入同一个文件(xlsx每个视图一个工作表, hdf5每个视图一个键, 名称为 含量类型-有机物类型)
+    :param time_range: 只读取该时间范围(ps)内的帧, 见 TableData
+    :param stride: 帧间隔
+    :param smooth: 折线视图的平滑方法, 见 smoothing.SMOOTH_METHODS
+    :param window: 平滑窗口帧数
+    :param rate: 折线视图是否导出变化速率
+    :param wide: xlsx列数超过上限时的处理方式, 见 export.split_table
+    :return: (导出的文件, {视图: 错误信息})
+    """
+    # 文件之间已经并行, 单个文件不再多进程解析
+    data = TableData(file_path, footstep, use_cache, workers=1, time_range=time_range, stride=stride)
+    temperature = None
+    if initial_temp is not None and heating_rate is not None:
+        temperature = (initial_temp, heating_rate)
+    # 各视图共用排序依据、质量等中间结果
+    tables, errors = view_tables(data, top_n, rank_by, [BATCH_VIEWS[view] for view in views], temperature, smooth,
+                                 window, rate)
+    names = {'-'.join(BATCH_VIEWS[view]): view for view in views}
+    errors = {names[name]: error for name, error in errors.items()}
+
+    os.makedirs(os.path.dirname(prefix) or '.', exist_ok=True)
+    ext = FORMAT_EXTENSIONS[export_format]
+    if combine:
+        # 工作表名(键)与界面导出全部视图时一致, 为 含量类型-有机物类型; 方法名超过31个字符, 截断后无法区分
+        return (write_tables(prefix + ext, tables, wide) if tables else []), errors
+    written = []
+    for name, df in tables.items():
+        written.extend(write_tables(f'{prefix}_{names[name]}{ext}', {'Sheet1': df}, wide))
+    return written, errors
+
+
+def run(files: List[str], views: List[str], workers=None, output_dir=None, **kwargs) -> int:
+    """
+    用进程池并行处理多个文件, 各子进程各自写出导出文件
+    :return: 处理失败的文件数
+    """
+    base_dir = os.path.commonpath([os.path.dirname(path) for path in files])
+    failed = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(process_file, path, output_prefix(path, base_dir, output_dir), views, **kwargs): path
+                   for path in files}
+        for done, future in enumerate(as_completed(futures), 1):
+            path = futures[future]
+            try:
+                written, errors = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"[{done}/{len(files)}] 失败 {path}: {e}", file=sys.stderr)
+                continue
+            print(f"[{done}/{len(files)}] {path}: 导出 {len(written)} 个文件")
+            for view, error in errors.items():
+                print(f"    {view} 无法计算: {error}", file=sys.stderr)
+    return failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="批量处理species文件并导出数据, 不需要图形界面")
+    parser.add_argument('inputs', nargs='+', help="species文件、目录(按 --pattern 递归查找)或通配符")
+    parser.add_argument('-s', '--footstep', type=float, default=1, help="步长(fs), 默认为1")
+    parser.add_argument('--initial-temp', type=float, help="初始温度(K), 与升温速率同时给出时以温度为x轴")
+    parser.add_argument('--heating-rate', type=float, help="升温速率(K/ps)")
+    parser.add_argument('-v', '--views', nargs='+', default=['organic_content'],
+                        choices=list(BATCH_VIEWS) + ['all'], metavar='VIEW',
+                        help=f"要导出的视图, all为全部, 可选: {', '.join(BATCH_VIEWS)}")
+    parser.add_argument('--start', type=float, help="只读取该时间(ps)之后的帧, 以温度为x轴时为温度(K)")
+    parser.add_argument('--end', type=float, help="只读取该时间(ps)之前的帧, 以温度为x轴时为温度(K)")
+    parser.add_argument('--stride', type=int, default=1, help="每隔N帧读取一帧, 默认为1")
+    parser.add_argument('--top-n', type=int, help="只导出排名前N的物种, 其余合并为其他")
+    parser.add_argument('--rank-by', default='peak', choices=['peak', 'integral', 'final'], help="物种排序依据")
+    parser.add_argument('--smooth', choices=list(SMOOTH_METHODS), help="折线视图的平滑方法")
+    parser.add_argument('--window', type=int, default=SMOOTH_WINDOW, help=f"平滑窗口帧数, 默认为{SMOOTH_WINDOW}")
+    parser.add_argument('--rate', action='store_true', help="折线视图导出对时间(或温度)的变化速率")
+    parser.add_argument('-f', '--format', default='xlsx', choices=list(FORMAT_EXTENSIONS),
+                        help="导出格式, parquet需要安装pyarrow, hdf5需要安装tables")
+    parser.add_argument('--wide', default='split', choices=['split', 'transpose'],
+                        help="xlsx列数超过上限(16384)时的处理方式: split 按列拆分为多个工作表, transpose 转置为每个物种一行")
+    parser.add_argument('-c', '--combine', action='store_true',
+                        help="每个输入文件的全部视图写入同一个文件, xlsx每个视图一个工作表, hdf5每个视图一个键, 名称为 含量类型-有机物类型")
+    parser.add_argument('-o', '--output', help="输出目录, 默认写在各输入文件旁")
+    parser.add_argument('-p', '--pattern', default=DEFAULT_PATTERN, help=f"目录中要处理的文件名, 默认 {DEFAULT_PATTERN}")
+    parser.add_argument('-j', '--jobs', type=int, help="并行进程数, 默认为CPU核数")
+    parser.add_argument('--no-cache', action='store_true', help="不使用磁盘缓存")
+    args = parser.parse_args(argv)
+
+    if (args.initial_temp is None) != (args.heating_rate is None):
+        parser.error("初始温度和升温速率需要同时给出")
+    if args.stride < 1:
+        parser.error("帧间隔应为正整数")
+    if args.window < 1:
+        parser.error("平滑窗口应为正整数")
+    time_range = None
+    if args.start is not None or args.end is not None:
+        time_range = (args.start, args.end)
+        if args.initial_temp is not None:
+            try:
+                time_range = temperature_to_time(time_range, args.initial_temp, args.heating_rate)
+            except ValueError as e:
+                parser.error(str(e))
+    files = find_files(args.inputs, args.pattern)
+    if not files:
+        parser.error("没有找到要处理的文件")
+    views = list(BATCH_VIEWS) if 'all' in args.views else list(dict.fromkeys(args.views))
+
+    failed = run(files, views, args.jobs, args.output, footstep=args.footstep, initial_temp=args.initial_temp,
+                 heating_rate=args.heating_rate, top_n=args.top_n, rank_by=args.rank_by,
+                 export_format=args.format, use_cache=not args.no_cache, combine=args.combine, time_range=time_range,
+                 stride=args.stride, smooth=args.smooth, window=args.window, rate=args.rate, wide=args.wide)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    multiprocessing.freeze_support()  # 打包后多进程需要
+    sys.exit(main())
@@ -0,0 +1,257 @@
+import argparse
+import datetime
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from data import VIEWS, TableData, ViewCache, read_file
+from export import write_tables
+from synthetic import generate
+
+# 各规模的合成文件参数, 见 synthetic.generate
+TIERS = {
+    'small': dict(frames=1000, species=50, sparsity=0.5, churn=0.05),
+    'medium': dict(frames=20000, species=300, sparsity=0.8, churn=0.02),
+    'large': dict(frames=200000, species=2000, sparsity=0.95, churn=0.01),
+}
+DEFAULT_TIERS = ['small', 'medium']
+# 运行时间超过基准的比例且至少慢 REGRESSION_MIN_SECONDS 时视为性能退化, 避免毫秒级阶段的抖动被误报
+REGRESSION_THRESHOLD = 0.1
+REGRESSION_MIN_SECONDS = 0.005
+# 结果默认保存的目录
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_results')
+
+
+def measure(fn: Callable, repeat=3, memory=True) -> Dict[str, float]:
+    """
+    测量函数的运行时间和内存峰值
+    :param fn: 无参数的函数
+    :param repeat: 计时次数, 取墙钟时间最短的一次
+    :param memory: 是否另外运行一次, 用tracemalloc记录Python及NumPy分配的内存峰值
+    :return: {'wall': 墙钟时间(s), 'cpu': 本进程CPU时间(s), 'peak_mb': 内存峰值(MB)}
+    """
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        wall, cpu = time.perf_counter(), time.process_time()
+        fn()
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+        if best is None or wall < best[0]:
+            best = (wall, cpu)
+    result = {'wall': best[0], 'cpu': best[1]}
+    if memory:
+        # tracemalloc会显著拖慢运行, 不与计时同时进行
+        gc.collect()
+        tracemalloc.start()
+        try:
+            fn()
+            result['peak_mb'] = tracemalloc.get_traced_memory()[1] / (1 << 20)
+        finally:
+            tracemalloc.stop()
+    return result
+
+
+def tier_file(tier: str, data_dir: str, seed=0) -> str:
+    """
+    生成或复用该规模的合成文件, 文件名包含全部参数
+    """
+    params = TIERS[tier]
+    name = 'species_{}_{}.txt'.format(tier, '_'.join(f'{key}{value}' for key, value in params.items()) + f'_seed{seed}')
+    path = os.path.join(data_dir, name)
+    if not os.path.exists(path):
+        os.makedirs(data_dir, exist_ok=True)
+        generate(path + '.tmp', seed=seed, **params)
+        os.replace(path + '.tmp', path)
+    return path
+
+
+# 绘图阶段使用的QApplication, 需要在整个进程中保持存在
+_qt_app = None
+
+
+def plot_lines(data: TableData):
+    """
+    按界面的绘图流程绘制折线并完整重绘一次
+    """
+    global _qt_app
+    from PyQt5.QtWidgets import QApplication
+    from qt import MplCanvas
+
+    if _qt_app is None:
+        _qt_app = QApplication.instance() or QApplication(['benchmark'])
+    canvas = MplCanvas(None, width=14, height=8, dpi=100)
+    canvas.set_lines(data.x, data.y)
+    canvas.draw()
+    canvas.close()
+
+
+def cases(path: str, work_dir: str) -> List[Tuple[str, Callable]]:
+    """
+    需要测量的各阶段, 依次为 读取、构建TableData、各视图、绘图、导出
+    """
+    result = [
+        ('read_file', lambda: read_file(path, use_cache=False)),
+        ('read_file_cached', lambda: read_file(path, use_cache=True)),
+        ('TableData.__init__', lambda: TableData(path, use_cache=False)),
+    ]
+    data = TableData(path)
+
+    def view(key):
+        def run():
+            clone = data.clone()
+            clone._shared = dict()  # 单独计时, 不复用其他视图已缓存的中间结果及视图结果
+            clone._views = ViewCache()
+            try:
+                return clone.view(*key)
+            except ValueError:  # 含未知元素时无法计算质量
+                return None
+        return run
+
+    methods = dict()  # 多个视图对应同一方法时只测量一次
+    for key, (method, _, _) in VIEWS.items():
+        methods.setdefault(method, key)
+    for method, key in methods.items():
+        result.append((f'view.{method}', view(key)))
+
+    def top20():
+        clone = data.clone()
+        clone._views = ViewCache()  # 复用排序依据, 但不复用视图结果
+        return clone.view('含量', '有机物', top_n=20)
+
+    result.append(('view.organic_content.top20', top20))
+    data.clone().view('含量', '有机物')
+    result.append(('view.organic_content.cached', lambda: data.clone().view('含量', '有机物')))
+
+    content = data.clone()
+    _, export_df = content.view('含量', '有机物')
+    result.append(('plot.organic_content', lambda: plot_lines(content)))
+    result.append(('export.xlsx', lambda: write_tables(os.path.join(work_dir, 'export.xlsx'), {'Sheet1': export_df})))
+    result.append(('export.csv', lambda: write_tables(os.path.join(work_dir, 'export.csv'), {'Sheet1': export_df})))
+    return result
+
+
+def environment() -> dict:
+    """
+    运行环境及代码版本, 比较不同版本的结果时参考
+    """
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, timeout=10,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        commit = ''
+    return {
+        'time': datetime.datetime.now().isoformat(timespec='seconds'),
+        'commit': commit or 'unknown',
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def run(tiers: List[str], data_dir: str, repeat=3, memory=True, only=None, seed=0) -> dict:
+    """
+    依次测量各规模下的各阶段
+    :param tiers: 规模名
+    :param data_dir: 合成文件目录
+    :param repeat: 计时次数
+    :param memory: 是否记录内存峰值
+    :param only: 只测量名称包含其中任一字符串的阶段
+    :param seed: 合成文件的随机种子
+    :return: 可直接保存为JSON的结果
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        for tier in tiers:
+            path = tier_file(tier, data_dir, seed)
+            for name, fn in cases(path, work_dir):
+                if only and not any(item in name for item in only):
+                    continue
+                metrics = measure(fn, repeat, memory)
+                results.append({'tier': tier, 'case': name, **metrics})
+                print(format_row(tier, name, metrics), flush=True)
+    return {'environment': environment(), 'tiers': {tier: TIERS[tier] for tier in tiers}, 'seed': seed,
+            'results': results}
+
+
+def format_row(tier: str, name: str, metrics: Dict[str, float], baseline: Dict[str, float] = None) -> str:
+    row = f"{tier:<8}{name:<52}{metrics['wall'] * 1000:>10.1f} ms{metrics['cpu'] * 1000:>10.1f} ms"
+    row += f"{metrics['peak_mb']:>10.1f} MB" if 'peak_mb' in metrics else ' ' * 13
+    if baseline is not None:
+        row += f"{metrics['wall'] / max(baseline['wall'], 1e-9):>8.2f}x"
+    return row
+
+
+def compare(current: dict, baseline: dict, threshold=REGRESSION_THRESHOLD) -> int:
+    """
+    与之前保存的结果比较, 只比较参数相同的规模
+    :return: 运行时间超过基准 threshold 比例的阶段数
+    """
+    same_tiers = {tier for tier, params in current['tiers'].items()
+                  if baseline['tiers'].get(tier) == params and baseline.get('seed') == current.get('seed')}
+    old = {(item['tier'], item['case']): item for item in baseline['results'] if item['tier'] in same_tiers}
+    print(f"\n与 {baseline['environment']['commit']} ({baseline['environment']['time']}) 比较:")
+    regressions = 0
+    for item in current['results']:
+        base = old.get((item['tier'], item['case']))
+        if base is None:
+            continue
+        row = format_row(item['tier'], item['case'], item, base)
+        if item['wall'] > base['wall'] * (1 + threshold) and item['wall'] - base['wall'] > REGRESSION_MIN_SECONDS:
+            regressions += 1
+            row += '  变慢'
+        print(row)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="在不同规模的合成species文件上测量读取、视图计算、绘图和导出的性能")
+    parser.add_argument('-t', '--tiers', nargs='+', default=DEFAULT_TIERS, choices=list(TIERS),
+                        help=f"规模, 默认 {' '.join(DEFAULT_TIERS)}")
+    parser.add_argument('-k', '--only', nargs='+', help="只测量名称包含其中任一字符串的阶段, 如 read view.organic")
+    parser.add_argument('-r', '--repeat', type=int, default=3, help="计时次数, 取最短的一次")
+    parser.add_argument('--no-memory', action='store_true', help="不记录内存峰值, 可节省一次运行")
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'QtDataAnalyse-benchmark'),
+                        help="合成文件目录, 已生成的文件会被复用")
+    parser.add_argument('--seed', type=int, default=0, help="合成文件的随机种子")
+    parser.add_argument('-o', '--output', help=f"结果文件, 默认保存在 {RESULTS_DIR} 中, 以时间和提交命名")
+    parser.add_argument('-c', '--compare', help="与之前保存的结果文件比较")
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                        help="运行时间超过基准该比例时视为变慢, 有变慢时返回1")
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')  # 绘图阶段不需要显示窗口
+    print(f"{'规模':<6}{'阶段':<50}{'墙钟时间':>11}{'CPU时间':>11}{'内存峰值':>9}")
+    current = run(args.tiers, args.data_dir, args.repeat, not args.no_memory, args.only, args.seed)
+
+    output = args.output
+    if output is None:
+        env = current['environment']
+        stamp = env['time'].replace(':', '').replace('-', '')
+        output = os.path.join(RESULTS_DIR, f"{stamp}_{env['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as file:
+        json.dump(current, file, ensure_ascii=False, indent=2)
+    print(f"\n结果已保存到 {output}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as file:
+            baseline = json.load(file)
+        if compare(current, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
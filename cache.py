@@ -0,0 +1,107 @@
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import zipfile
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# 缓存格式版本, 修改存储结构时递增以使旧缓存失效
+CACHE_VERSION = 2
+# 内容哈希只取文件首尾各1MB, 保证大文件也能快速校验
+HASH_BLOCK_SIZE = 1 << 20
+
+
+def cache_dir() -> str:
+    """
+    缓存目录, 可通过环境变量 QTDATAANALYSE_CACHE_DIR 指定
+    """
+    path = os.environ.get('QTDATAANALYSE_CACHE_DIR')
+    if path:
+        return path
+    if os.name == 'nt':
+        base = os.environ.get('LOCALAPPDATA', os.path.expanduser('~'))
+    elif sys.platform == 'darwin':
+        base = os.path.expanduser('~/Library/Caches')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache'))
+    return os.path.join(base, 'QtDataAnalyse')
+
+
+def cache_path(data_source: str, kind='dense') -> str:
+    name = hashlib.sha1(os.path.abspath(data_source).encode('utf-8')).hexdigest()
+    return os.path.join(cache_dir(), f'{name}.{kind}.npz')
+
+
+def file_fingerprint(data_source: str) -> dict:
+    """
+    文件指纹: 路径、大小、修改时间及首尾内容哈希
+    """
+    stat = os.stat(data_source)
+    digest = hashlib.blake2b(digest_size=16)
+    with open(data_source, 'rb') as file:
+        digest.update(file.read(HASH_BLOCK_SIZE))
+        if stat.st_size > HASH_BLOCK_SIZE:
+            file.seek(max(HASH_BLOCK_SIZE, stat.st_size - HASH_BLOCK_SIZE))
+            digest.update(file.read(HASH_BLOCK_SIZE))
+    return {
+        'version': CACHE_VERSION,
+        'path': os.path.abspath(data_source),
+        'size': stat.st_size,
+        'mtime': stat.st_mtime_ns,
+        'hash': digest.hexdigest(),
+    }
+
+
+def load(data_source: str, kind='dense') -> Optional[Tuple[Dict[str, np.ndarray], List[str]]]:
+    """
+    读取缓存, 缓存不存在、损坏或与文件指纹不一致时返回None
+    :param data_source: species文件路径
+    :param kind: 存储方式, dense 或 sparse
+    :return: ({数组名: 数组}, 物种名)
+    """
+    path = cache_path(data_source, kind)
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path, allow_pickle=False) as npz:
+            if json.loads(str(npz['key'])) == file_fingerprint(data_source):
+                arrays = {name: npz[name] for name in npz.files if name not in ('key', 'species')}
+                return arrays, npz['species'].tolist()
+    except (zipfile.BadZipFile, EOFError, ValueError, KeyError):
+        pass  # 缓存文件被截断或损坏, 与过期缓存一样删除后重新解析
+    except OSError:
+        return None
+
+    # 文件已变化或缓存损坏, 删除该缓存
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+    return None
+
+
+def save(data_source: str, arrays: Dict[str, np.ndarray], species: List[str], kind='dense', fingerprint=None):
+    """
+    写入缓存, 先写唯一的临时文件再替换, 写入失败时忽略
+    :param data_source: species文件路径
+    :param arrays: 需要保存的数组
+    :param species: 物种名
+    :param kind: 存储方式, dense 或 sparse
+    :param fingerprint: 解析前取得的文件指纹, 解析期间文件仍在写入时缓存因指纹不一致而失效; 默认为当前指纹
+    """
+    path = cache_path(data_source, kind)
+    tmp_path = None
+    try:
+        if fingerprint is None:
+            fingerprint = file_fingerprint(data_source)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=os.path.dirname(path))
+        with os.fdopen(fd, 'wb') as file:
+            np.savez(file, key=json.dumps(fingerprint), species=np.array(species, dtype=str), **arrays)
+        os.replace(tmp_path, path)
+    except OSError:
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.remove(tmp_path)
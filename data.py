@@ -1,36 +1,736 @@
+import copy
+import io
+import mmap
+import os
 import re
-from typing import List
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Iterator, List, Optional, Tuple
 
 import numpy as np
 import pandas as pd
 
-
-def read_file(data_source: str) -> pd.DataFrame:
-    def read_two_lines_at_a_time(file_path):
-        with open(file_path, 'r') as file:
-            lines = file.readlines()
-            # Ensure there's an even number of lines to pair up
-            if len(lines) % 2 != 0:
-                lines.append('')  # Add an empty string if needed
-            paired_lines = [lines[i:i + 2] for i in range(0, len(lines), 2)]
-            return paired_lines
-
-    source_data = read_two_lines_at_a_time(data_source)
-    df_data = list()
-    for group in source_data:
-        col = group[0].strip().split()[1:]
-        data = group[1].strip().split()
-        if len(data) == 0:
+import cache
+import profiler
+import smoothing
+from smoothing import SMOOTH_WINDOW
+from sparse import SparseCounts
+
+
+# 每帧固定的统计列, 其余列均为物种
+META_COLUMNS = ['Timestep', 'No_Moles', 'No_Specs']
+# 超过该大小(字节)的文件默认使用多进程解析
+PARALLEL_THRESHOLD = 64 << 20
+# 解析时每隔多少帧报告一次进度
+PROGRESS_INTERVAL = 4096
+# 建立帧索引时每次扫描的字节数
+INDEX_CHUNK_SIZE = 64 << 20
+# 只解析部分帧时, 合并后的单个连续区间最大字节数, 同时也是多进程分配的单位
+SPAN_SIZE = 16 << 20
+# 解析时间步时读取的数据行开头字节数
+TIMESTEP_WIDTH = 24
+# 跟踪模式下每次读取的字节数
+FOLLOW_CHUNK_SIZE = 16 << 20
+# 按行分块计算时每块的最大字节数, 限制整个矩阵类型转换产生的临时数组
+BLOCK_SIZE = 16 << 20
+# Windows 下进程池的最大进程数, 超过时 ProcessPoolExecutor 抛出 ValueError
+WINDOWS_MAX_WORKERS = 61
+
+
+def _grow(array: np.ndarray, rows: int) -> np.ndarray:
+    """
+    保证数组至少有rows行, 不足时按倍数扩容
+    """
+    if len(array) >= rows:
+        return array
+    grown = np.zeros((max(rows, len(array) * 2),) + array.shape[1:], dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+
+def default_workers() -> int:
+    """
+    默认进程数: CPU核数, Windows 下不超过 WINDOWS_MAX_WORKERS
+    """
+    workers = os.cpu_count() or 1
+    if sys.platform == 'win32':
+        workers = min(workers, WINDOWS_MAX_WORKERS)
+    return workers
+
+
+def iter_frames(data_source: str) -> Iterator[Tuple[str, str]]:
+    """
+    逐帧读取species文件, 每次只读入一对 表头/数据 行
+    :param data_source: 文件路径
+    :return: (表头行, 数据行) 的生成器, 空数据帧会被跳过
+    """
+    with open(data_source, 'r') as file:
+        yield from iter_line_pairs(file)
+
+
+def iter_line_pairs(lines: Iterator[str]) -> Iterator[Tuple[str, str]]:
+    lines = iter(lines)
+    for header in lines:
+        line = next(lines, '')
+        if not line.strip():
             continue
-        aline = dict()
-        for i in range(len(col)):
-            aline[col[i]] = data[i]
-        df_data.append(aline)
+        yield header, line
+
+
+class SpeciesBuilder:
+    """
+    列式构建器: 物种名只在首次出现时分配整数ID, 表头行与上一帧相同时不再重新分词,
+    每帧的数量直接写入预分配、按需倍增扩容的 uint16/uint32 矩阵
+    """
+
+    def __init__(self, row_capacity=1024, col_capacity=64):
+        self.species: List[str] = list()
+        self.species_index: Dict[str, int] = dict()
+        self.rows = 0
+        self._meta = np.zeros((row_capacity, len(META_COLUMNS)), dtype=np.int64)
+        self._counts = np.zeros((row_capacity, col_capacity), dtype=np.uint16)
+        self._last_header = None
+        self._meta_pos = None  # 固定列在数据行中的位置
+        self._species_pos = None  # 物种列在数据行中的位置
+        self._species_ids = None  # 物种列对应的物种ID
+
+    def _intern(self, name: str) -> int:
+        idx = self.species_index.get(name)
+        if idx is None:
+            idx = len(self.species)
+            self.species_index[name] = idx
+            self.species.append(name)
+        return idx
+
+    def copy(self) -> 'SpeciesBuilder':
+        """
+        共享数组的拷贝, 之后追加的帧只写入两者已有行数之后的位置, 不改变原对象已构建的部分
+        """
+        other = copy.copy(self)
+        other.species = list(self.species)
+        other.species_index = dict(self.species_index)
+        return other
+
+    def resume(self, table: 'SpeciesTable'):
+        """
+        接在已解析的稠密结果之后继续追加帧, table 的数组在扩容时才复制, 不会被修改
+        """
+        self.species = list(table.species)
+        self.species_index = {name: idx for idx, name in enumerate(self.species)}
+        self.rows = len(table.meta)
+        self._meta = table.meta
+        self._counts = table.counts
+        self._last_header = None
+
+    def _parse_header(self, header: str):
+        col = header.strip().split()[1:]
+        meta_pos = [col.index(name) for name in META_COLUMNS]
+        species_pos = [i for i, name in enumerate(col) if name not in META_COLUMNS]
+        self._meta_pos = np.array(meta_pos, dtype=np.intp)
+        self._species_pos = np.array(species_pos, dtype=np.intp)
+        self._species_ids = np.array([self._intern(col[i]) for i in species_pos], dtype=np.intp)
+        if len(self.species) > self._counts.shape[1]:
+            width = max(len(self.species), self._counts.shape[1] * 2)
+            counts = np.zeros((self._counts.shape[0], width), dtype=self._counts.dtype)
+            counts[:, :self._counts.shape[1]] = self._counts
+            self._counts = counts
+        self._last_header = header
+
+    def add_frame(self, header: str, line: str):
+        if header != self._last_header:
+            self._parse_header(header)
+
+        if self.rows == self._meta.shape[0]:
+            self._meta = _grow(self._meta, self.rows + 1)
+            self._counts = _grow(self._counts, self.rows + 1)
+
+        values = np.array(line.split(), dtype=np.int64)
+        self._meta[self.rows] = values[self._meta_pos]
+        self._store(values[self._species_pos])
+        self.rows += 1
+
+    def _store(self, counts: np.ndarray):
+        if len(counts) and counts.max() > np.iinfo(self._counts.dtype).max:
+            self._counts = self._counts.astype(np.uint32)
+        self._counts[self.rows, self._species_ids] = counts
+
+    def _compact(self):
+        # 把倍增扩容的数组缩小为实际大小, 结果不再引用多出的容量
+        if self._meta.shape[0] != self.rows:
+            self._meta = self._meta[:self.rows].copy()
+        if self._counts.shape != (self.rows, len(self.species)):
+            self._counts = self._counts[:self.rows, :len(self.species)].copy()
+
+    def table(self, compact=True) -> 'SpeciesTable':
+        """
+        构建解析结果
+        :param compact: 是否先缩小数组. 跟踪模式还会继续追加帧, 不缩小以免每次读取都复制全部数据
+        """
+        if compact:
+            self._compact()
+        return SpeciesTable(self._meta[:self.rows], self._counts[:self.rows, :len(self.species)], self.species)
+
+
+class SparseSpeciesBuilder(SpeciesBuilder):
+    """
+    稀疏构建器: 只记录非零数量的 (帧, 物种, 数量), 不分配 帧 × 物种 的稠密矩阵
+    """
+
+    def __init__(self, row_capacity=1024, nnz_capacity=1 << 16):
+        super().__init__(row_capacity, col_capacity=0)
+        self._counts = np.zeros((0, 0), dtype=np.uint16)  # 稀疏模式下不使用
+        self._rows = np.zeros(nnz_capacity, dtype=np.int64)
+        self._cols = np.zeros(nnz_capacity, dtype=np.int64)
+        self._values = np.zeros(nnz_capacity, dtype=np.uint16)
+        self.nnz = 0
+
+    def _store(self, counts: np.ndarray):
+        nonzero = np.flatnonzero(counts)
+        end = self.nnz + len(nonzero)
+        if end > len(self._values):
+            self._rows = _grow(self._rows, end)
+            self._cols = _grow(self._cols, end)
+            self._values = _grow(self._values, end)
+        if len(nonzero) and counts[nonzero].max() > np.iinfo(self._values.dtype).max:
+            self._values = self._values.astype(np.uint32)
+        self._rows[self.nnz:end] = self.rows
+        self._cols[self.nnz:end] = self._species_ids[nonzero]
+        self._values[self.nnz:end] = counts[nonzero]
+        self.nnz = end
+
+    def _compact(self):
+        # 数量矩阵由 from_coo 重新排列生成, 只需缩小固定列
+        if self._meta.shape[0] != self.rows:
+            self._meta = self._meta[:self.rows].copy()
+
+    def table(self, compact=True) -> 'SpeciesTable':
+        if compact:
+            self._compact()
+        counts = SparseCounts.from_coo(self._rows[:self.nnz], self._cols[:self.nnz], self._values[:self.nnz],
+                                       (self.rows, len(self.species)))
+        return SpeciesTable(self._meta[:self.rows], counts, self.species)
+
+
+class SpeciesTable:
+    """
+    解析结果: 固定列矩阵(Timestep/No_Moles/No_Specs)、物种数量矩阵及物种名
+    """
+
+    def __init__(self, meta: np.ndarray, counts: np.ndarray | SparseCounts, species: List[str]):
+        self.meta = meta
+        self.counts = counts
+        self.species = list(species)
+
+    @property
+    def sparse(self) -> bool:
+        return isinstance(self.counts, SparseCounts)
+
+    def counts_frame(self) -> pd.DataFrame:
+        """
+        物种数量的DataFrame, 稠密时为矩阵的视图, 稀疏时各列为SparseDtype
+        """
+        if self.sparse:
+            return self.counts.to_frame(self.species)
+        return pd.DataFrame(self.counts, columns=self.species, copy=False)
+
+    def to_dataframe(self) -> pd.DataFrame:
+        meta = pd.DataFrame(self.meta, columns=META_COLUMNS)
+        return pd.concat([meta, self.counts_frame()], axis=1)
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        if self.sparse:
+            return dict(meta=self.meta, **self.counts.to_arrays())
+        return {'meta': self.meta, 'counts': self.counts}
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray], species: List[str]) -> 'SpeciesTable':
+        if 'counts' in arrays:
+            return cls(arrays['meta'], arrays['counts'], species)
+        counts = SparseCounts(arrays['indptr'], arrays['indices'], arrays['data'], tuple(arrays['shape']))
+        return cls(arrays['meta'], counts, species)
+
+
+class Cancelled(Exception):
+    """
+    加载被取消, 由进度回调抛出
+    """
+
+
+def parse_file(data_source: str, workers=None, sparse=False, progress=None) -> SpeciesTable:
+    """
+    解析species文件, 大文件按帧边界切块后多进程并行解析
+    :param data_source: 文件路径
+    :param workers: 进程数, None时按文件大小自动选择, 1为单进程
+    :param sparse: 是否以稀疏矩阵存储物种数量
+    :param progress: 进度回调 progress(已读字节, 总字节, 已解析帧数), 抛出 Cancelled 可中止解析
+    :return: 解析结果
+    """
+    size = os.path.getsize(data_source)
+    if workers is None:
+        workers = default_workers() if size >= PARALLEL_THRESHOLD else 1
+    if workers > 1:
+        return parse_file_parallel(data_source, workers, sparse, progress)
+
+    builder = SparseSpeciesBuilder() if sparse else SpeciesBuilder()
+    done = 0
+    for header, line in iter_frames(data_source):
+        builder.add_frame(header, line)
+        done += len(header) + len(line)  # species文件为ASCII, 字符数即字节数
+        if progress is not None and builder.rows % PROGRESS_INTERVAL == 0:
+            progress(done, size, builder.rows)
+    if progress is not None:
+        progress(size, size, builder.rows)
+    return builder.table()
+
+
+def split_frames(data_source: str, parts: int) -> List[Tuple[int, int]]:
+    """
+    将文件按 '# Timestep' 表头行切分为若干字节区间
+    :param data_source: 文件路径
+    :param parts: 期望的区间数
+    :return: [(起始偏移, 结束偏移)]
+    """
+    size = os.path.getsize(data_source)
+    if size == 0:
+        return []
+    bounds = [0]
+    with open(data_source, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for i in range(1, parts):
+            pos = mm.find(b'\n#', max(size * i // parts, bounds[-1]))
+            if pos < 0:
+                break
+            bounds.append(pos + 1)
+    bounds.append(size)
+    return [(start, end) for start, end in zip(bounds[:-1], bounds[1:]) if end > start]
+
+
+def _parse_range(args) -> SpeciesTable:
+    data_source, start, end, sparse = args
+    return _parse_spans((data_source, [(start, end)], sparse))
+
+
+def _parse_spans(args) -> SpeciesTable:
+    """
+    依次解析若干字节区间, 每个区间都从帧的表头行开始
+    """
+    data_source, spans, sparse = args
+    builder = SparseSpeciesBuilder() if sparse else SpeciesBuilder()
+    with open(data_source, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for start, end in spans:
+            # 大区间在表头行处再切为不超过 SPAN_SIZE 的小段, 每次只有一小段同时以字节和字符串形式存在
+            while start < end:
+                stop = end
+                if end - start > SPAN_SIZE:
+                    pos = mm.find(b'\n#', start + SPAN_SIZE, end)
+                    stop = end if pos < 0 else pos + 1
+                for header, line in iter_line_pairs(io.StringIO(mm[start:stop].decode())):
+                    builder.add_frame(header, line)
+                start = stop
+    return builder.table()
+
+
+def merge_tables(tables: List[SpeciesTable]) -> SpeciesTable:
+    """
+    按物种首次出现顺序合并多个分块结果, 与整体解析的结果一致
+    """
+    species_index: Dict[str, int] = dict()
+    for table in tables:
+        for name in table.species:
+            species_index.setdefault(name, len(species_index))
+
+    rows = sum(len(table.meta) for table in tables)
+    dtype = np.result_type(np.uint16, *[table.counts.dtype for table in tables])
+    meta = np.concatenate([table.meta for table in tables]) if tables else np.zeros((0, len(META_COLUMNS)), np.int64)
+    sparse = any(table.sparse for table in tables)
+    counts = np.zeros((0 if sparse else rows, len(species_index)), dtype=dtype)
+    coo = []
+    row = 0
+    for table in tables:
+        n = len(table.meta)
+        ids = np.array([species_index[name] for name in table.species], dtype=np.intp)
+        if sparse:
+            r, c, v = table.counts.to_coo()
+            coo.append((r + row, ids[c], v.astype(dtype)))
+        else:
+            counts[row:row + n, ids] = table.counts
+        row += n
+    if sparse:
+        r, c, v = (np.concatenate(part) for part in zip(*coo))
+        counts = SparseCounts.from_coo(r, c, v, (rows, len(species_index)))
+    return SpeciesTable(meta, counts, list(species_index))
+
+
+def parse_file_parallel(data_source: str, workers: int, sparse=False, progress=None) -> SpeciesTable:
+    # 切为不超过 SPAN_SIZE 的小块, 任务数多于进程数, 进度更及时, 取消时只需等待正在解析的小块
+    ranges = split_frames(data_source, max(workers, -(-os.path.getsize(data_source) // SPAN_SIZE)))
+    return _parse_groups(data_source, [[span] for span in ranges], workers, sparse, progress)
+
+
+def _parse_groups(data_source: str, groups: List[List[Tuple[int, int]]], workers: int, sparse=False,
+                  progress=None) -> SpeciesTable:
+    """
+    每组字节区间作为一个任务交给进程池解析, 再按组的顺序合并.
+    取消或出错时不再等待正在解析的任务, 尚未开始的任务直接取消
+    """
+    sizes = [sum(end - start for start, end in spans) for spans in groups]
+    total = sum(sizes)
+    executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        futures = {executor.submit(_parse_spans, (data_source, spans, sparse)): size
+                   for spans, size in zip(groups, sizes)}
+        done = frames = 0
+        for future in as_completed(futures):
+            done += futures[future]
+            frames += len(future.result().meta)
+            if progress is not None:
+                progress(done, total, frames)
+        tables = [future.result() for future in futures]
+    except BaseException:
+        executor.shutdown(wait=False, cancel_futures=True)
+        raise
+    executor.shutdown()
+    return merge_tables(tables)
+
+
+class SpeciesFollower:
+    """
+    跟踪仍在写入的species文件, 记录最后一个完整帧之后的字节偏移, 每次只解析新追加的帧
+    """
+
+    def __init__(self, data_source: str, use_cache=True, workers=None):
+        self.data_source = data_source
+        self.use_cache = use_cache
+        self.workers = workers
+        self.offset = 0
+        self.builder = SpeciesBuilder()
+
+    def load(self, progress=None) -> int:
+        """
+        按帧索引读取已写完的帧(使用索引缓存, 大文件多进程解析), 之后从最后一个完整帧的结束位置继续跟踪
+        :param progress: 解析进度回调, 见 parse_file
+        :return: 读取的帧数
+        """
+        index = frame_index(self.data_source, self.use_cache)
+        end = index.size
+        frames = index.select()
+        if len(index):
+            # 最后一帧的表头行和数据行都以换行符结束才算写完
+            last = int(index.offsets[-1])
+            with open(self.data_source, 'rb') as file:
+                file.seek(last)
+                if file.read(index.size - last).count(b'\n') < 2:
+                    end = last
+                    frames = frames[frames < len(index) - 1]
+
+        self.builder = SpeciesBuilder()
+        if len(frames):
+            self.builder.resume(parse_frames(self.data_source, index, frames, self.workers, False, progress))
+        self.offset = end
+        return self.builder.rows
+
+    def copy(self) -> 'SpeciesFollower':
+        """
+        可独立推进的拷贝, 见 SpeciesBuilder.copy. 同一时间只应有一个拷贝在读取
+        """
+        other = copy.copy(self)
+        other.builder = self.builder.copy()
+        return other
 
+    def poll(self) -> int:
+        """
+        分块解析上次调用之后追加的完整帧, 块末尾不完整的行并入下一块, 未写完的帧留到下次
+        :return: 新增帧数, 文件变短(被截断或重新写入)时返回-1
+        """
+        size = os.path.getsize(self.data_source)
+        if size < self.offset:
+            return -1
+
+        rows = self.builder.rows
+        with open(self.data_source, 'rb') as file:
+            file.seek(self.offset)
+            position = self.offset
+            pending = b''
+            while position < size:
+                chunk = file.read(min(FOLLOW_CHUNK_SIZE, size - position))
+                if not chunk:
+                    break
+                position += len(chunk)
+                lines = (pending + chunk).split(b'\n')
+                pending = lines.pop()  # 最后一段没有换行符, 尚未读完或尚未写完
+                if len(lines) % 2:  # 表头行的数据行还在后面
+                    pending = lines.pop() + b'\n' + pending
+                for i in range(0, len(lines), 2):
+                    header, line = lines[i].decode(), lines[i + 1].decode()
+                    if line.strip():
+                        self.builder.add_frame(header, line)
+                    self.offset += len(lines[i]) + len(lines[i + 1]) + 2
+        return self.builder.rows - rows
+
+
+class FrameIndex:
+    """
+    帧索引: 每帧表头行的字节偏移及时间步, 只读取部分帧时直接定位, 不必解析整个文件
+    """
+
+    def __init__(self, offsets: np.ndarray, timesteps: np.ndarray, size: int):
+        self.offsets = offsets  # 表头行的起始位置
+        self.timesteps = timesteps  # 时间步, 数据行为空的帧为-1
+        self.size = size  # 建立索引时的文件大小, 即最后一帧的结束位置
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def select(self, timesteps=None, stride=1) -> np.ndarray:
+        """
+        选出时间步范围内每隔stride帧的一帧
+        :param timesteps: (起始, 结束) 时间步, 包含两端, None为不限
+        :param stride: 帧间隔
+        :return: 选中帧的序号
+        """
+        selected = self.timesteps >= 0
+        if timesteps is not None:
+            start, end = timesteps
+            if start is not None:
+                selected &= self.timesteps >= start
+            if end is not None:
+                selected &= self.timesteps <= end
+        return np.flatnonzero(selected)[::max(int(stride), 1)]
+
+    def spans(self, frames: np.ndarray) -> List[Tuple[int, int]]:
+        """
+        选中帧的字节区间, 相邻的帧合并为一个区间, 单个区间不超过 SPAN_SIZE
+        """
+        starts = self.offsets[frames].tolist()
+        ends = np.append(self.offsets[1:], self.size)[frames].tolist()
+        spans = []
+        for start, end in zip(starts, ends):
+            if spans and spans[-1][1] == start and end - spans[-1][0] <= SPAN_SIZE:
+                spans[-1][1] = end
+            else:
+                spans.append([start, end])
+        return [(start, end) for start, end in spans]
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        return {'offsets': self.offsets, 'timesteps': self.timesteps, 'size': np.array(self.size, dtype=np.int64)}
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray]) -> 'FrameIndex':
+        return cls(arrays['offsets'], arrays['timesteps'], int(arrays['size']))
+
+
+def _parse_timesteps(buffer: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    """
+    批量解析数据行开头的时间步
+    :param buffer: 整个文件的字节
+    :param starts: 数据行的起始位置
+    :return: 时间步, 数据行为空或不以数字开头时为-1
+    """
+    positions = starts[:, None] + np.arange(TIMESTEP_WIDTH)
+    window = buffer[np.minimum(positions, len(buffer) - 1)]
+    window[positions >= len(buffer)] = ord(' ')
+    digit = (window >= ord('0')) & (window <= ord('9'))
+    # 跳过行首空白后应为数字
+    first = np.argmax((window != ord(' ')) & (window != ord('\t')), axis=1)
+    valid = digit[np.arange(len(starts)), first]
+    column = np.arange(TIMESTEP_WIDTH)
+    after = ~digit & (column >= first[:, None])
+    end = np.where(after.any(axis=1), after.argmax(axis=1), TIMESTEP_WIDTH)
+    in_number = (column >= first[:, None]) & (column < end[:, None])
+    power = np.where(in_number, end[:, None] - 1 - column, 0)
+    values = np.where(in_number, (window.astype(np.int64) - ord('0')) * np.int64(10) ** power, 0).sum(axis=1)
+    return np.where(valid, values, -1)
+
+
+def build_frame_index(data_source: str) -> FrameIndex:
+    """
+    分块扫描文件建立帧索引, 只查找换行符和表头行, 不解析物种
+    """
+    size = os.path.getsize(data_source)
+    if size == 0:
+        return FrameIndex(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), 0)
+    offsets, timesteps = [], []
+    with open(data_source, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        buffer = np.frombuffer(mm, dtype=np.uint8)
+        try:
+            for chunk_start in range(0, size, INDEX_CHUNK_SIZE):
+                newlines = np.flatnonzero(buffer[chunk_start:chunk_start + INDEX_CHUNK_SIZE] == ord('\n'))
+                newlines += chunk_start
+                line_starts = newlines + 1
+                if chunk_start == 0:
+                    line_starts = np.concatenate([[0], line_starts])
+                line_starts = line_starts[line_starts < size]
+                headers = line_starts[buffer[line_starts] == ord('#')]
+                # 表头行之后的一行为数据行, 表头行跨过本块末尾时单独查找
+                data_starts = np.empty(len(headers), dtype=np.int64)
+                i = np.searchsorted(newlines, headers)
+                inside = i < len(newlines)
+                data_starts[inside] = newlines[i[inside]] + 1
+                for j in np.flatnonzero(~inside):
+                    pos = mm.find(b'\n', int(headers[j]))
+                    data_starts[j] = size if pos < 0 else pos + 1
+                offsets.append(headers.astype(np.int64))
+                timesteps.append(_parse_timesteps(buffer, data_starts))
+        finally:
+            del buffer  # 释放对mmap的引用后才能关闭
+    return FrameIndex(np.concatenate(offsets), np.concatenate(timesteps), size)
+
+
+def frame_index(data_source: str, use_cache=True) -> FrameIndex:
+    """
+    读取帧索引, 缓存无效时重新扫描并保存, 文件变化(如继续追加)后缓存自动失效
+    """
+    fingerprint = None
+    if use_cache:
+        cached = cache.load(data_source, 'index')
+        if cached is not None:
+            return FrameIndex.from_arrays(cached[0])
+        # 扫描前取文件指纹, 扫描期间文件继续写入时不会把不完整的索引当作整个文件的索引
+        fingerprint = cache.file_fingerprint(data_source)
+    with profiler.phase('建立索引'):
+        index = build_frame_index(data_source)
+    if use_cache:
+        cache.save(data_source, index.to_arrays(), [], 'index', fingerprint)
+    return index
+
+
+def parse_frames(data_source: str, index: FrameIndex, frames: np.ndarray, workers=None, sparse=False,
+                 progress=None) -> SpeciesTable:
+    """
+    只解析选中的帧, 耗时与选中帧的大小成正比
+    :param data_source: 文件路径
+    :param index: 帧索引
+    :param frames: 选中帧的序号, 见 FrameIndex.select
+    :param workers: 进程数, None时按选中部分的大小自动选择, 1为单进程
+    :param sparse: 是否以稀疏矩阵存储物种数量
+    :param progress: 解析进度回调, 见 parse_file
+    :return: 解析结果
+    """
+    spans = index.spans(frames)
+    total = sum(end - start for start, end in spans)
+    if workers is None:
+        workers = default_workers() if total >= PARALLEL_THRESHOLD else 1
+    workers = min(workers, len(spans))
+    if workers > 1:
+        # 按字节数把区间依次分组, 每组不超过 SPAN_SIZE 且至少workers组, 保持帧的顺序
+        parts = max(workers, -(-total // SPAN_SIZE))
+        bounds = np.searchsorted(np.cumsum([end - start for start, end in spans]),
+                                 [total * i // parts for i in range(1, parts)])
+        groups = [spans[a:b] for a, b in zip([0, *bounds], [*bounds, len(spans)]) if b > a]
+        return _parse_groups(data_source, groups, workers, sparse, progress)
+
+    builder = SparseSpeciesBuilder() if sparse else SpeciesBuilder()
+    done = 0
+    with open(data_source, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for start, end in spans:
+            for header, line in iter_line_pairs(io.StringIO(mm[start:end].decode())):
+                builder.add_frame(header, line)
+            done += end - start
+            if progress is not None:
+                progress(done, total, builder.rows)
+    return builder.table()
+
+
+def load_table(data_source: str, use_cache=True, workers=None, sparse=False, progress=None, timesteps=None,
+               stride=1) -> SpeciesTable:
+    """
+    读取species文件, 缓存有效时直接从二进制缓存加载
+    :param data_source: 文件路径
+    :param use_cache: 是否使用磁盘缓存
+    :param workers: 解析进程数, 见 parse_file
+    :param sparse: 是否以稀疏矩阵存储物种数量
+    :param progress: 解析进度回调, 见 parse_file
+    :param timesteps: (起始, 结束) 时间步, 给出时按帧索引只解析该范围内的帧, 结果不写入缓存
+    :param stride: 帧间隔, 大于1时每隔stride帧读取一帧
+    :return: 解析结果
+    """
+    if timesteps is not None or stride > 1:
+        index = frame_index(data_source, use_cache)
+        frames = index.select(timesteps, stride)
+        if len(frames) == 0:
+            raise ValueError("所选范围内没有数据")
+        with profiler.phase('解析'):
+            return parse_frames(data_source, index, frames, workers, sparse, progress)
+
+    if not use_cache:
+        with profiler.phase('解析'):
+            return parse_file(data_source, workers, sparse, progress)
+
+    kind = 'sparse' if sparse else 'dense'
+    with profiler.phase('读取缓存'):
+        cached = cache.load(data_source, kind)
+    if cached is not None:
+        return SpeciesTable.from_arrays(*cached)
+
+    # 解析前取文件指纹, 解析期间文件继续写入时缓存的结果不会被当作完整文件的结果
+    fingerprint = cache.file_fingerprint(data_source)
+    with profiler.phase('解析'):
+        table = parse_file(data_source, workers, sparse, progress)
+    with profiler.phase('写入缓存'):
+        cache.save(data_source, table.to_arrays(), table.species, kind, fingerprint)
+    return table
+
+
+def read_file(data_source: str, use_cache=True, workers=None, sparse=False) -> pd.DataFrame:
     # 构造DataFrame
-    df = pd.DataFrame(df_data)
-    df = df.apply(pd.to_numeric).fillna(0)
-    return df
+    return load_table(data_source, use_cache, workers, sparse).to_dataframe()
+
+
+def percentages(values: np.ndarray, total: np.ndarray) -> np.ndarray:
+    """
+    按行计算百分比, 总数为0的行记为0
+    :param values: 帧 × 列 的数值矩阵
+    :param total: 每帧的总数
+    :return: 百分比矩阵
+    """
+    values = np.asarray(values, dtype=np.float64)
+    total = np.asarray(total, dtype=np.float64)
+    result = np.zeros(values.shape, dtype=np.float64)
+    np.divide(values, total[:, None], out=result, where=total[:, None] != 0)
+    return result * 100
+
+
+def _block_rows(counts, itemsize: int) -> int:
+    # 每块的行数, 使块内 帧 × 物种 的临时数组不超过 BLOCK_SIZE
+    return max(1, BLOCK_SIZE // max(counts.shape[1] * itemsize, 1))
+
+
+def class_sums(counts, indicator: np.ndarray) -> np.ndarray:
+    """
+    各帧每个分类的数量总和. 稠密矩阵按行分块, 每个分类只取其物种列求和, 不把整个矩阵转为int64
+    :param counts: 帧 × 物种 数量矩阵, 稠密矩阵或 SparseCounts
+    :param indicator: 物种 × 分类 的指示矩阵
+    :return: 帧 × 分类 的int64矩阵
+    """
+    if isinstance(counts, SparseCounts):  # 稀疏矩阵的乘积只遍历非零值
+        return (counts @ indicator).astype(np.int64)
+    ids = [np.flatnonzero(indicator[:, k]) for k in range(indicator.shape[1])]
+    result = np.empty((len(counts), len(ids)), dtype=np.int64)
+    step = _block_rows(counts, counts.dtype.itemsize)
+    for start in range(0, len(counts), step):
+        block = counts[start:start + step]
+        for k, cols in enumerate(ids):
+            result[start:start + step, k] = block[:, cols].sum(axis=1, dtype=np.int64)
+    return result
+
+
+def weighted_sums(counts, weights: np.ndarray) -> np.ndarray:
+    """
+    各帧数量的加权和 counts @ weights. 稠密矩阵只取权重非零的物种列, 按行分块转为float64后相乘
+    :param counts: 帧 × 物种 数量矩阵, 稠密矩阵或 SparseCounts
+    :param weights: 长度为物种数的权重向量, 或 物种 × k 的权重矩阵
+    :return: 长度为帧数的向量, 或 帧 × k 的矩阵
+    """
+    if isinstance(counts, SparseCounts):
+        return counts @ weights
+    cols = np.flatnonzero(weights if weights.ndim == 1 else weights.any(axis=1))
+    weights = weights[cols]
+    result = np.empty((len(counts),) + weights.shape[1:], dtype=np.float64)
+    step = _block_rows(counts, np.dtype(np.float64).itemsize)
+    for start in range(0, len(counts), step):
+        result[start:start + step] = counts[start:start + step, cols] @ weights
+    return result
 
 
 class LineData:
@@ -39,64 +739,278 @@ class LineData:
         self.label = label
 
 
+# 只显示前N种物种时, 其余物种合并后的列名及图例名
+OTHERS_COLUMN = 'Others'
+OTHERS_LABEL = '其他'
+# 有机物按碳原子数细分的区间边界: C1-C4, C5-C13, C14-C40, C41-C100, C100以上
+CARBON_BINS = [5, 14, 41, 101]
+# 各分类总数列, 与 TableData._indicator 的列一一对应
+COUNT_COLUMNS = ['Organic_Count', 'Non_Organic_Count', 'C1_C4_Count', 'C5_C13_Count', 'C14_C40_Count',
+                 'C40_C100_Count', 'C40p_Count']
+
+
+# (含量类型, 有机物类型): (TableData方法, 是否支持只显示前N种, 柱状图数值格式, 折线图为None)
+VIEWS = {
+    ('含量', '有机物'): ('organic_content', True, None),
+    ('含量', '无机物'): ('inorganic_content', True, None),
+    ('含量', '有机物分类'): ('organic_classification_content', False, None),
+    ('含量', '最终有机产物'): ('organic_products', False, '{:.1f}%'),
+    ('含量', '最终有机产物分类'): ('organic_classification_products', False, '{:.1f}%'),
+    ('含量', '总分子个数'): ('moles_num', False, None),
+    ('数量', '有机物'): ('organic_amount', True, None),
+    ('数量', '无机物'): ('inorganic_amount', True, None),
+    ('数量', '有机物分类'): ('organic_classification_amount', False, None),
+    ('数量', '最终有机产物'): ('organic_products_amount', False, '{:.1f}'),
+    ('数量', '最终有机产物分类'): ('organic_classification_products_amount', False, '{:.1f}'),
+    ('数量', '总分子个数'): ('moles_num', False, None),
+    ('质量百分比', '有机物'): ('organic_mass_percentage', True, None),
+    ('质量百分比', '有机物分类'): ('organic_classification_mass_percentage', False, None),
+    ('质量百分比', '最终有机产物分类'): ('organic_classification_products_mass_percentage', False, '{:.1f}'),
+}
+
+
+def time_to_timesteps(time_range, footstep=1) -> Optional[Tuple[Optional[float], Optional[float]]]:
+    """
+    时间范围(ps)换算为时间步范围, 与 TableData.timestamps 的换算一致
+    :param time_range: (起始, 结束), 任一端为None时不限
+    :param footstep: 步长
+    :return: (起始, 结束) 时间步, time_range为None时返回None
+    """
+    if time_range is None:
+        return None
+    return tuple(None if t is None else float(t) * 1000 / footstep for t in time_range)
+
+
+def temperature_to_time(temperature_range, initial_temp, heating_rate) -> Tuple[Optional[float], Optional[float]]:
+    """
+    程序升温时把温度范围换算为时间范围(ps), 与 TableData.set_x_temp 的换算一致
+    :param temperature_range: (起始, 结束) 温度, 任一端为None时不限
+    :param initial_temp: 初始温度
+    :param heating_rate: 升温速率
+    :return: (起始, 结束) 时间
+    """
+    heating_rate = float(heating_rate)
+    if heating_rate == 0:
+        raise ValueError("升温速率为0时无法按温度选择范围")
+    start, end = (None if t is None else (float(t) - float(initial_temp)) / heating_rate for t in temperature_range)
+    return (start, end) if heating_rate > 0 else (end, start)
+
+
+# 每份数据缓存的视图结果的内存上限(MB), 超出时按最近最少使用淘汰
+VIEW_CACHE_BUDGET_MB = 512
+
+
+class ViewCache:
+    """
+    已计算的视图结果, 同一份数据的各个克隆共用, 数据更新时整体替换为新的缓存
+    """
+
+    def __init__(self, budget_mb=VIEW_CACHE_BUDGET_MB):
+        self.budget = int(budget_mb * (1 << 20))
+        self._items: OrderedDict[tuple, tuple] = OrderedDict()
+        self._sizes: Dict[tuple, int] = dict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._items)
+
+    def get(self, key: tuple) -> Optional[tuple]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None:
+                self._items.move_to_end(key)
+            return item
+
+    def put(self, key: tuple, item: tuple, size: int):
+        """
+        :param key: 视图及其参数
+        :param item: 计算结果
+        :param size: 结果占用的字节数, 最新的结果即使超出上限也会保留
+        """
+        with self._lock:
+            self._items[key] = item
+            self._items.move_to_end(key)
+            self._sizes[key] = size
+            while len(self._items) > 1 and sum(self._sizes.values()) > self.budget:
+                old, _ = self._items.popitem(last=False)
+                del self._sizes[old]
+
+
 class TableData:
-    def __init__(self, file_path, footstep=1):
+    def __init__(self, file_path, footstep=1, use_cache=True, follow=False, sparse=False, progress=None,
+                 workers=None, table: SpeciesTable = None, time_range=None, stride=1):
         self.x: List[str | int] = list()
         self.y: List[LineData] = list()
-        self.df = read_file(file_path)
         self.index_col = "Timestep"
+        self.axis: tuple = ('Timestep',)  # x轴及其参数, 视图缓存按此区分
         self.footstep = footstep
 
-        self.df['Timestep'] = self.df['Timestep'] * footstep / 1000
-
         self.ignore_columns = ['Timestep', 'No_Specs', 'No_Moles']
-        self.timestamps = self.df['Timestep']
-
-        self.organic_columns = []
-        self.C1_C4_columns = []
-        self.C5_C13_columns = []
-        self.C14_C40_columns = []
-        self.C40_C100_columns = []
-        self.C40p_columns = []
-        self.non_organic_columns = []
-
-        for col in self.df.columns:
-            if col in self.ignore_columns:  # 排除忽略列
-                continue
-
-            if 'C' in col and 'H' in col:  # 同时含C和H判定为有机物
-                self.organic_columns.append(col)
-                continue
-
-            res = re.search(r'C(\d+)', col)
-            if res and int(res.group(1)) >= 2:  # C后有数字且大于2判定为有机物
-                self.organic_columns.append(col)
 
-            elif not res or int(res.group(1)) < 2:
-                self.non_organic_columns.append(col)
-
-        for col in self.organic_columns:  # 有机物细分判断
+        # 跟踪模式下记录已读取的位置, 之后只解析新追加的帧
+        self.follower = SpeciesFollower(file_path, use_cache, workers) if follow else None
+
+        self._reset()
+        if table is not None:  # 已在其他进程中解析
+            self._extend(table)
+        elif self.follower is None:
+            # 给出时间范围(ps)或帧间隔时按帧索引只读取需要的帧; 跟踪模式总是读取全部帧
+            with profiler.phase('读取'):
+                table = load_table(file_path, use_cache, workers, sparse, progress,
+                                   time_to_timesteps(time_range, footstep), stride)
+            self._extend(table)
+        else:
+            with profiler.phase('读取'):
+                self.follower.load(progress)
+            self.follow()
+
+    def _reset(self):
+        self.rows = 0
+        self.species: List[str] = list()
+        self.species_index: Dict[str, int] = dict()
+        self.carbon_numbers = np.zeros(0, dtype=np.int64)  # 每个物种的碳原子数, 未标注数字时为0
+        self.organic_mask = np.zeros(0, dtype=bool)  # 每个物种是否为有机物
+        self.composition = np.zeros((0, len(ELEMENTS)), dtype=np.int64)  # 物种 × 元素 的原子数
+        self.molecular_weights = np.zeros(0, dtype=np.float64)  # 每个物种的分子量
+        self.unknown_elements: Dict[str, List[str]] = dict()  # 未知元素及含有它的物种
+        self._indicator = np.zeros((0, len(COUNT_COLUMNS)), dtype=np.int64)  # 物种 × 分类 的指示矩阵
+        self._time = np.zeros(0, dtype=np.float64)
+        self._class_counts = np.zeros((0, len(COUNT_COLUMNS)), dtype=np.int64)
+        self._shared: Dict[tuple, np.ndarray] = dict()  # 多个视图共用的中间结果, 数据更新时清空
+        self._views = ViewCache()  # 已计算的视图结果, 数据更新时清空
+        self._update_columns()
+
+    def _classify(self, species: List[str]):
+        """
+        对新出现的物种分类, 每个分子式只解析一次
+        """
+        new = species[len(self.species):]
+        if not new:
+            return
+        self.species = list(species)
+        self.species_index = {name: idx for idx, name in enumerate(self.species)}
+
+        carbon = np.zeros(len(new), dtype=np.int64)
+        has_ch = np.zeros(len(new), dtype=bool)
+        composition = np.zeros((len(new), len(ELEMENTS)), dtype=np.int64)
+        known = np.ones(len(new), dtype=bool)
+        for i, col in enumerate(new):
             res = re.search(r'C(\d+)', col)
-            if not res or int(res.group(1)) < 5:  # C1-C4
-                self.C1_C4_columns.append(col)
-            elif int(res.group(1)) < 14:  # C5-C13
-                self.C5_C13_columns.append(col)
-            elif int(res.group(1)) < 41:  # C14-C40
-                self.C14_C40_columns.append(col)
-            elif int(res.group(1)) < 101:  # C14-C100
-                self.C40_C100_columns.append(col)
-                self.C40p_columns.append(col)
-            else:
-                self.C40p_columns.append(col)
-
-        # 统计每个时间段的各有机物数量总和
-        self.df['Organic_Count'] = self.df[self.organic_columns].sum(axis=1)  # 有机物总数
-        self.df['Non_Organic_Count'] = self.df[self.non_organic_columns].sum(axis=1)  # 无机物总数
-        self.df['C1_C4_Count'] = self.df[self.C1_C4_columns].sum(axis=1)  # C1-C4总数
-        self.df['C5_C13_Count'] = self.df[self.C5_C13_columns].sum(axis=1)  # C5-C13总数
-        self.df['C14_C40_Count'] = self.df[self.C14_C40_columns].sum(axis=1)  # C14-C40总数
-        self.df['C40_C100_Count'] = self.df[self.C40_C100_columns].sum(axis=1)  # C40-C100总数
-        self.df['C40p_Count'] = self.df[self.C40p_columns].sum(axis=1)  # C40+总数
+            carbon[i] = int(res.group(1)) if res else 0
+            has_ch[i] = 'C' in col and 'H' in col
+            for element, count in parse_formula(col).items():
+                if element in atomic_weights:
+                    composition[i, ELEMENTS.index(element)] = count
+                else:  # 记录未知元素, 计算质量时统一报告
+                    self.unknown_elements.setdefault(element, []).append(col)
+                    known[i] = False
+
+        # 物种 × 元素 组成矩阵及分子量, 含未知元素的物种分子量为NaN
+        self.composition = np.concatenate([self.composition, composition])
+        weights = composition @ np.array([atomic_weights[e] for e in ELEMENTS], dtype=np.float64)
+        self.molecular_weights = np.concatenate([self.molecular_weights, np.where(known, weights, np.nan)])
+        self.carbon_numbers = np.concatenate([self.carbon_numbers, carbon])
+        # 同时含C和H, 或C后有数字且大于等于2判定为有机物
+        self.organic_mask = np.concatenate([self.organic_mask, has_ch | (carbon >= 2)])
+
+        # 有机物细分: 0: C1-C4, 1: C5-C13, 2: C14-C40, 3: C41-C100, 4: C100以上
+        bins = np.digitize(self.carbon_numbers, CARBON_BINS)
+        organic = self.organic_mask
+        self._indicator = np.stack([
+            organic,  # 有机物
+            ~organic,  # 无机物
+            organic & (bins == 0),  # C1-C4
+            organic & (bins == 1),  # C5-C13
+            organic & (bins == 2),  # C14-C40
+            organic & (bins == 3),  # C40-C100
+            organic & (bins >= 3),  # C40+
+        ], axis=1).astype(np.int64)
+        self._update_columns()
+
+    def _update_columns(self):
+        species = np.array(self.species, dtype=object)
+        self.organic_columns = species[self._indicator[:, 0] > 0].tolist()
+        self.non_organic_columns = species[self._indicator[:, 1] > 0].tolist()
+        self.C1_C4_columns = species[self._indicator[:, 2] > 0].tolist()
+        self.C5_C13_columns = species[self._indicator[:, 3] > 0].tolist()
+        self.C14_C40_columns = species[self._indicator[:, 4] > 0].tolist()
+        self.C40_C100_columns = species[self._indicator[:, 5] > 0].tolist()
+        self.C40p_columns = species[self._indicator[:, 6] > 0].tolist()
+
+    def _extend(self, table: SpeciesTable):
+        """
+        追加table中尚未处理的帧, 计算量只与新增帧数有关
+        """
+        with profiler.phase('分类'):
+            start = self.rows
+            rows = len(table.meta)
+            self._classify(table.species)
+
+            self._time = _grow(self._time, rows)
+            self._time[start:rows] = table.meta[start:rows, 0] * self.footstep / 1000
+
+            # 统计每个时间段的各分类数量总和
+            self._class_counts = _grow(self._class_counts, rows)
+            self._class_counts[start:rows] = class_sums(table.counts[start:rows], self._indicator)
+
+            self.rows = rows
+            self.counts = table.counts
+            self._shared = dict()  # 克隆仍持有旧的中间结果, 与其共享的旧数据一致
+            self._views = ViewCache()
+            # DataFrame只是各数组的视图, 不复制数据
+            self.df = pd.concat([
+                pd.DataFrame(self._time[:rows], columns=['Timestep'], copy=False),
+                pd.DataFrame(table.meta[:, 1:], columns=META_COLUMNS[1:], copy=False),
+                table.counts_frame(),
+                pd.DataFrame(self._class_counts[:rows], columns=COUNT_COLUMNS, copy=False),
+            ], axis=1)
+            self.timestamps = self.df['Timestep']
+
+    def check_elements(self, columns: List[str]):
+        """
+        检查物种是否都只含已知元素, 否则无法计算质量
+        :param columns: 需要计算质量的物种
+        """
+        columns = set(columns)
+        unknown = {element: [col for col in cols if col in columns] for element, cols in self.unknown_elements.items()}
+        unknown = {element: cols for element, cols in unknown.items() if cols}
+        if unknown:
+            detail = '; '.join(f"{element}: {', '.join(cols)}" for element, cols in unknown.items())
+            raise ValueError(f"分子式中含有未知元素, 无法计算质量 ({detail})")
+
+    def clone(self, follow=False) -> 'TableData':
+        """
+        共享底层数组的浅拷贝, 拷贝之间的x/y、索引列及新增的派生列互不影响
+        :param follow: 是否同时拷贝跟踪状态. 拷贝读取新追加的帧时只写入共享数组中原对象已有行数之后的位置,
+                       可在后台线程中跟踪, 不影响其他线程正在使用的原对象
+        """
+        other = copy.copy(self)
+        other.x = list()
+        other.y = list()
+        other.index_col = "Timestep"
+        other.axis = ('Timestep',)
+        other.follower = self.follower.copy() if follow and self.follower is not None else None
+        other._update_columns()
+        other.df = self.df.copy(deep=False)
+        other.timestamps = other.df['Timestep']
+        return other
+
+    def follow(self) -> int:
+        """
+        跟踪模式下读取文件新追加的帧
+        :return: 新增帧数
+        """
+        if self.follower is None:
+            return 0
+
+        with profiler.phase('读取'):
+            added = self.follower.poll()
+            if added < 0:  # 文件被截断或重新写入, 从头加载
+                self._reset()
+                added = self.follower.load()
+        if added or self.rows == 0:
+            self._extend(self.follower.builder.table(compact=False))
+        return added
 
     def set_x_temp(self, initial_temp, heating_rate):
         """
@@ -111,59 +1025,97 @@ class TableData:
         self.x = initial_temp + heating_rate * self.timestamps
         self.df['Temperature'] = self.x
         self.index_col = 'Temperature'
+        self.axis = ('Temperature', initial_temp, heating_rate)
 
-    def organic_content(self):  # 有机物含量
-        for col in self.organic_columns:
-            self.df[col + '_percentages'] = self.df[col] / self.df['Organic_Count'] * 100
-            self.df[col + '_percentages'] = self.df[col + '_percentages'].apply(lambda x: 0 if pd.isna(x) else x)
-
-        self.x = self.df[self.index_col]
-
-        return_col = [self.index_col]
-
-        for column in self.organic_columns:
-            col_name = column + '_percentages'
-            self.y.append(LineData(self.df[col_name], column))
-            return_col.append(col_name)
-
-        return self.df[return_col]
-
-    def inorganic_content(self):
-        for col in self.non_organic_columns:
-            self.df[col + '_percentages'] = self.df[col] / self.df['Non_Organic_Count'] * 100
-            self.df[col + '_percentages'] = self.df[col + '_percentages'].apply(lambda x: 0 if pd.isna(x) else x)
-
-        self.x = self.df[self.index_col]
-        return_col = [self.index_col]
-
-        for column in self.non_organic_columns:
-            col_name = column + '_percentages'
-            self.y.append(LineData(self.df[col_name], column))
-            return_col.append(col_name)
-
-        return self.df[return_col]
+    def view(self, count_type, organic_type, top_n=None, rank_by='peak', smooth=None, window=SMOOTH_WINDOW,
+             rate=False):
+        """
+        按 (含量类型, 有机物类型) 计算视图, 见 VIEWS
+        :param count_type: 含量、数量 或 质量百分比
+        :param organic_type: 有机物、无机物、有机物分类、最终有机产物、最终有机产物分类 或 总分子个数
+        :param top_n: 只显示排名前N的物种, 仅对逐个物种的视图有效
+        :param rank_by: 物种排序依据
+        :param smooth: 平滑方法, 见 smoothing.SMOOTH_METHODS, 仅对折线图有效
+        :param window: 平滑窗口帧数
+        :param rate: 是否显示对x轴(时间或温度)的变化速率, 仅对折线图有效
+        :return: (柱状图横轴标签, 导出数据), 折线图的横轴标签为None.
+                 同一数据、同一x轴下相同参数的视图直接返回缓存的结果, 不应修改返回的表
+        """
+        method, top_n_view, bar_format = VIEWS[(count_type, organic_type)]
+        args = {'top_n': top_n, 'rank_by': rank_by} if top_n_view else {}
+        transform = (smooth, window, rate) if bar_format is None and (smooth is not None or rate) else None
+        key = (method, tuple(args.items()), transform, self.axis)
+        with profiler.phase('视图'):
+            cached = self._views.get(key)
+            if cached is not None:
+                result, self.x, y = cached
+                self.y = list(y)
+            else:
+                self.y = list()
+                result = getattr(self, method)(**args)
+                if transform is not None:
+                    result = self._transform_lines(result, *transform)
+                table = result[1] if bar_format is not None else result
+                self._views.put(key, (result, self.x, list(self.y)), int(table.memory_usage(index=False).sum()))
+        return result if bar_format is not None else (None, result)
+
+    def _transform_lines(self, result: pd.DataFrame, smooth=None, window=SMOOTH_WINDOW, rate=False) -> pd.DataFrame:
+        """
+        对折线视图的全部列一次平滑或求变化速率, 见 smoothing.transform
+        :param result: 视图的导出数据, 第一列为索引列, 其余各列与self.y一一对应
+        :return: 变换后的导出数据, 变化速率列名加上 _rate
+        """
+        x = result[self.index_col].to_numpy(dtype=np.float64)
+        columns = [col for col in result.columns if col != self.index_col]
+        values = smoothing.transform(result[columns].to_numpy(dtype=np.float64), x, smooth, window, rate)
+        names = [f'{col}_rate' for col in columns] if rate else columns
+        transformed = pd.DataFrame(values, columns=names)
+        transformed.insert(0, self.index_col, x)
+        self.y = [LineData(transformed[name], line.label) for name, line in zip(names, self.y)]
+        return transformed
+
+    def organic_content(self, top_n=None, rank_by='peak'):  # 有机物含量
+        columns, others = self._top_species(self.organic_columns, top_n, rank_by)
+        return self._content(columns, columns, 'Organic_Count', others=bool(others))
+
+    def inorganic_content(self, top_n=None, rank_by='peak'):
+        columns, others = self._top_species(self.non_organic_columns, top_n, rank_by)
+        return self._content(columns, columns, 'Non_Organic_Count', others=bool(others))
 
     def organic_classification_content(self):
-        self.df['C1_C4_percentages'] = self.df['C1_C4_Count'] / self.df['Organic_Count'] * 100
-        self.df['C5_C13_percentages'] = self.df['C5_C13_Count'] / self.df['Organic_Count'] * 100
-        self.df['C14_C40_percentages'] = self.df['C14_C40_Count'] / self.df['Organic_Count'] * 100
-        self.df['C40_C100_percentages'] = self.df['C40_C100_Count'] / self.df['Organic_Count'] * 100
-
-        # 确保在C1_C4_Count为0的情况下避免除以零错误
-        self.df['C1_C4_percentages'] = self.df['C1_C4_percentages'].apply(lambda x: 0 if pd.isna(x) else x)
-        self.df['C5_C13_percentages'] = self.df['C5_C13_percentages'].apply(lambda x: 0 if pd.isna(x) else x)
-        self.df['C14_C40_percentages'] = self.df['C14_C40_percentages'].apply(lambda x: 0 if pd.isna(x) else x)
-        self.df['C40_C100_percentages'] = self.df['C40_C100_percentages'].apply(lambda x: 0 if pd.isna(x) else x)
+        # 总数为0时百分比记为0, 避免除以零
+        return self._content(['C1_C4_Count', 'C5_C13_Count', 'C14_C40_Count', 'C40_C100_Count'],
+                             ['C1-C4', 'C5-C13', 'C14-C40', 'C40-C100'], 'Organic_Count',
+                             ['C1_C4_percentages', 'C5_C13_percentages', 'C14_C40_percentages',
+                              'C40_C100_percentages'])
+
+    def _content(self, columns: List[str], labels: List[str], total_col: str, col_names: List[str] = None,
+                 others=False):
+        """
+        各列占总数的百分比, 结果单独存放, 不修改self.df
+        :param columns: 参与计算的列
+        :param labels: 各列的图例名
+        :param total_col: 总数列
+        :param col_names: 结果列名, 默认为 列名_percentages
+        :param others: 是否添加"其他"列(总数减去各列之和)
+        :return: 索引列及各百分比列
+        """
+        if col_names is None:
+            col_names = [col + '_percentages' for col in columns]
+        values = self.df[columns].to_numpy()
+        total = self.df[total_col].to_numpy()
+        if others:
+            values = np.column_stack([values, total - values.sum(axis=1, dtype=np.int64)])
+            labels = labels + [OTHERS_LABEL]
+            col_names = col_names + [OTHERS_COLUMN + '_percentages']
+        result = pd.DataFrame(percentages(values, total), columns=col_names)
+        result.insert(0, self.index_col, self.df[self.index_col].to_numpy())
 
         self.x = self.df[self.index_col]
+        for label, col_name in zip(labels, col_names):
+            self.y.append(LineData(result[col_name], label))
 
-        self.y.append(LineData(self.df["C1_C4_percentages"], "C1-C4"))
-        self.y.append(LineData(self.df["C5_C13_percentages"], "C5-C13"))
-        self.y.append(LineData(self.df["C14_C40_percentages"], "C14-C40"))
-        self.y.append(LineData(self.df["C40_C100_percentages"], "C40-C100"))
-
-        return self.df[
-            [self.index_col, "C1_C4_percentages", "C5_C13_percentages", "C14_C40_percentages", "C40_C100_percentages"]]
+        return result
 
     def organic_products(self):
         last_timestamp_index = self.df[self.index_col].idxmax()
@@ -210,18 +1162,62 @@ class TableData:
         output_dict.update(data)
         return names, pd.DataFrame(output_dict, index=[0])
 
-    def organic_amount(self):
-        self.x = self.df[self.index_col]
-        for column in self.organic_columns:
-            self.y.append(LineData(self.df[column], label=column))
+    def organic_amount(self, top_n=None, rank_by='peak'):
+        return self._amount(self.organic_columns, 'Organic_Count', top_n, rank_by)
 
-        return self.df[[self.index_col] + self.organic_columns]
+    def inorganic_amount(self, top_n=None, rank_by='peak'):
+        return self._amount(self.non_organic_columns, 'Non_Organic_Count', top_n, rank_by)
 
-    def inorganic_amount(self):
+    def _amount(self, columns: List[str], total_col: str, top_n=None, rank_by='peak'):
+        columns, others = self._top_species(columns, top_n, rank_by)
         self.x = self.df[self.index_col]
-        for column in self.non_organic_columns:
+        for column in columns:
             self.y.append(LineData(self.df[column], label=column))
-        return self.df[[self.index_col] + self.non_organic_columns]
+
+        result = self.df[[self.index_col] + columns]
+        if others:
+            # 其余物种合并为一条线: 总数减去选中物种之和
+            selected = self.counts[:, self._ids(columns)].sum(axis=1, dtype=np.int64)
+            others_count = pd.Series(self.df[total_col].to_numpy() - selected, index=self.df.index)
+            result = result.assign(**{OTHERS_COLUMN: others_count})
+            self.y.append(LineData(others_count, OTHERS_LABEL))
+        return result
+
+    def species_scores(self, rank_by='peak') -> np.ndarray:
+        """
+        每个物种的排序依据, 对整个数量矩阵一次归约得到
+        :param rank_by: peak 最大数量, integral 全部帧数量之和, final 最后一帧数量
+        :return: 长度为物种数的数组
+        """
+        if rank_by == 'peak':
+            return self._cached(('scores', rank_by), lambda: self.counts.max(axis=0))
+        if rank_by == 'integral':
+            return self._cached(('scores', rank_by), lambda: self.counts.sum(axis=0, dtype=np.int64))
+        if rank_by == 'final':
+            return self.counts[self.df[self.index_col].idxmax()]
+        raise ValueError(f"未知的排序依据: {rank_by}")
+
+    def _cached(self, key: tuple, compute):
+        """
+        数据更新前复用多个视图共用的中间结果, 如物种排序依据、每帧有机物总质量
+        """
+        if key not in self._shared:
+            self._shared[key] = compute()
+        return self._shared[key]
+
+    def _top_species(self, columns: List[str], top_n=None, rank_by='peak') -> Tuple[List[str], List[str]]:
+        """
+        按排序依据选出前top_n个物种
+        :return: (选中的物种, 其余物种), top_n为None时选中全部
+        """
+        if top_n is None or top_n >= len(columns):
+            return list(columns), []
+        scores = self.species_scores(rank_by)[self._ids(columns)].astype(np.float64)
+        order = np.argsort(-scores, kind='stable')
+        return [columns[i] for i in order[:top_n]], [columns[i] for i in order[top_n:]]
+
+    def _ids(self, columns: List[str]) -> np.ndarray:
+        return np.array([self.species_index[col] for col in columns], dtype=np.intp)
 
     def organic_classification_amount(self):
         self.x = self.df[self.index_col]
@@ -282,25 +1278,9 @@ class TableData:
     def organic_classification_products_mass_percentage(self):
         last_timestamp_index = self.df[self.index_col].idxmax()
 
-        C1_C4_weight = 0
-        C5_C13_weight = 0
-        C14_C40_weight = 0
-        C40p_weight = 0
-        all_weight = 0
-
-
-        for col in self.C1_C4_columns:
-            C1_C4_weight += self.df.loc[last_timestamp_index, col] * calculate_molecular_weight(col)
-
-        for col in self.C5_C13_columns:
-            C5_C13_weight += self.df.loc[last_timestamp_index, col] * calculate_molecular_weight(col)
-
-        for col in self.C14_C40_columns:
-            C14_C40_weight += self.df.loc[last_timestamp_index, col] * calculate_molecular_weight(col)
-
-        for col in self.C40p_columns:
-            C40p_weight += self.df.loc[last_timestamp_index, col] * calculate_molecular_weight(col)
-
+        # 最后一帧各物种的质量, 一次矩阵乘法得到各分类质量
+        weights = self.counts[last_timestamp_index] * self._organic_weights()
+        C1_C4_weight, C5_C13_weight, C14_C40_weight, C40p_weight = weights @ self._indicator[:, [2, 3, 4, 6]]
         all_weight = C1_C4_weight + C5_C13_weight + C14_C40_weight + C40p_weight
 
         # 创建一个字典来存储数据，便于绘图
@@ -322,6 +1302,50 @@ class TableData:
         output_dict.update(data)
         return names, pd.DataFrame(output_dict, index=[0])
 
+    # 有机物质量百分比(全部时间)
+    def organic_mass_percentage(self, top_n=None, rank_by='peak'):
+        weights = self._organic_weights()
+        labels, others = self._top_species(self.organic_columns, top_n, rank_by)
+        ids = self._ids(labels)
+        masses = self.counts[:, ids] * weights[ids]
+        total = self._cached(('organic_mass',), lambda: weighted_sums(self.counts, weights))  # 每帧有机物总质量
+        columns = [col + '_mass_percentages' for col in labels]
+        if others:
+            masses = np.column_stack([masses, total - masses.sum(axis=1)])
+            labels = labels + [OTHERS_LABEL]
+            columns.append(OTHERS_COLUMN + '_mass_percentages')
+        result = pd.DataFrame(percentages(masses, total), columns=columns)
+        result.insert(0, self.index_col, self.df[self.index_col].to_numpy())
+
+        self.x = self.df[self.index_col]
+        for column, col_name in zip(labels, columns):
+            self.y.append(LineData(result[col_name], column))
+
+        return result
+
+    # 有机物分类质量百分比(全部时间)
+    def organic_classification_mass_percentage(self):
+        weights = self._organic_weights()
+        # 按分类加权的指示矩阵, 分块相乘得到各分类每帧的质量
+        masses = self._cached(('class_mass',),
+                              lambda: weighted_sums(self.counts, weights[:, None] * self._indicator[:, [2, 3, 4, 6]]))
+        columns = ['C1_C4_mass_percentages', 'C5_C13_mass_percentages', 'C14_C40_mass_percentages',
+                   'C40p_mass_percentages']
+        result = pd.DataFrame(percentages(masses, masses.sum(axis=1)), columns=columns)
+        result.insert(0, self.index_col, self.df[self.index_col].to_numpy())
+
+        self.x = self.df[self.index_col]
+        for label, col_name in zip(['C1-C4', 'C5-C13', 'C14-C40', 'C40+'], columns):
+            self.y.append(LineData(result[col_name], label))
+
+        return result
+
+    def _organic_weights(self) -> np.ndarray:
+        """
+        有机物的分子量, 非有机物为0
+        """
+        self.check_elements(self.organic_columns)
+        return self._cached(('organic_weights',), lambda: np.where(self.organic_mask, self.molecular_weights, 0))
 
     def moles_num(self):
         self.x = self.df[self.index_col]
@@ -344,13 +1368,31 @@ atomic_weights = {
 }
 
 
-def calculate_molecular_weight(formula):
+# 元素顺序, 与 TableData.composition 的列一一对应
+ELEMENTS = list(atomic_weights)
+
+
+def parse_formula(formula) -> Dict[str, int]:
+    """
+    解析分子式中各元素的原子数
+    :param formula: 分子式, 如 C2H5OH
+    :return: {元素: 原子数}
+    """
     # 正则表达式匹配元素和数量
     pattern = r'([A-Z][a-z]*)(\d*)'
-    total_weight = 0.0
+    atoms: Dict[str, int] = dict()
 
     for element, count in re.findall(pattern, formula):
         count = int(count) if count else 1  # 如果没有数字，默认为1
+        atoms[element] = atoms.get(element, 0) + count
+
+    return atoms
+
+
+def calculate_molecular_weight(formula):
+    total_weight = 0.0
+
+    for element, count in parse_formula(formula).items():
         total_weight += atomic_weights[element] * count
 
     return total_weight
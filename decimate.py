@@ -0,0 +1,76 @@
+import numpy as np
+
+
+class MinMaxPyramid:
+    """
+    折线的多分辨率 min/max 金字塔.
+    第k层(k>=1)每个桶覆盖 2**k 个原始点, 记录桶内最小值和最大值所在的位置,
+    缩放或平移时只需按显示范围和像素宽度选层切片, 不用重新扫描全部数据.
+    """
+
+    def __init__(self, x, y):
+        self.x = np.asarray(x, dtype=np.float64)
+        self.y = np.asarray(y, dtype=np.float64)
+        n = len(self.y)
+        self.sorted = n < 2 or bool(np.all(np.diff(self.x) >= 0))  # x单调递增时才能按范围切片
+
+        self.levels = []
+        lo = hi = np.arange(n)
+        while len(lo) > 1:
+            m = len(lo) // 2 * 2
+            a, b = lo[0:m:2], lo[1:m:2]
+            new_lo = np.where(self.y[a] <= self.y[b], a, b)
+            a, b = hi[0:m:2], hi[1:m:2]
+            new_hi = np.where(self.y[a] >= self.y[b], a, b)
+            if m < len(lo):  # 奇数个桶时最后一个单独成桶
+                new_lo = np.append(new_lo, lo[-1])
+                new_hi = np.append(new_hi, hi[-1])
+            self.levels.append((new_lo, new_hi))
+            lo, hi = new_lo, new_hi
+
+    def __len__(self):
+        return len(self.y)
+
+    def query(self, x0, x1, max_points):
+        """
+        取显示范围内的点, 超过max_points时用对应层的桶内最小、最大值代替
+        :param x0: 显示范围左端
+        :param x1: 显示范围右端
+        :param max_points: 最多返回的点数
+        :return: (x, y)
+        """
+        n = len(self.y)
+        if self.sorted:
+            # 两端各多取一个点, 保证折线延伸到显示范围之外
+            i0 = max(int(np.searchsorted(self.x, x0, 'left')) - 1, 0)
+            i1 = min(int(np.searchsorted(self.x, x1, 'right')) + 1, n)
+        else:
+            i0, i1 = 0, n
+        count = i1 - i0
+        if count <= max_points or not self.levels:
+            return self.x[i0:i1], self.y[i0:i1]
+
+        # 每个桶输出两个点, 选择使桶数不超过 max_points/2 的最细层
+        level = min(int(np.ceil(np.log2(2 * count / max(max_points, 2)))), len(self.levels))
+        lo, hi = self.levels[level - 1]
+        b0, b1 = i0 >> level, ((i1 - 1) >> level) + 1
+        lo, hi = lo[b0:b1], hi[b0:b1]
+        idx = np.stack([np.minimum(lo, hi), np.maximum(lo, hi)], axis=1).ravel()
+        return self.x[idx], self.y[idx]
+
+
+def envelope(x, lower, upper, max_points):
+    """
+    将带状区域按等宽的桶合并, 每个桶取下边界的最小值和上边界的最大值, 保证抽稀后的区域覆盖原区域
+    :param x: 升序的x
+    :param lower: 下边界
+    :param upper: 上边界
+    :param max_points: 最多保留的点数
+    :return: (x, lower, upper)
+    """
+    x, lower, upper = np.asarray(x), np.asarray(lower), np.asarray(upper)
+    n = len(x)
+    if n <= max_points:
+        return x, lower, upper
+    starts = np.arange(0, n, int(np.ceil(n / max(max_points, 1))))
+    return x[starts], np.minimum.reduceat(lower, starts), np.maximum.reduceat(upper, starts)
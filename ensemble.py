@@ -0,0 +1,224 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+import profiler
+import smoothing
+from data import OTHERS_LABEL, TableData, default_workers, load_table, percentages, time_to_timesteps
+from smoothing import SMOOTH_WINDOW
+
+# 双侧95%置信区间的t分布临界值, 下标为自由度, 超出时用正态分布的1.96
+T95 = [np.nan, 12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228, 2.201, 2.179, 2.160, 2.145,
+       2.131, 2.120, 2.110, 2.101, 2.093, 2.086, 2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042]
+Z95 = 1.960
+# 有机物碳数分类在 TableData._class_counts 中的列及图例名
+CLASS_COLUMNS = [2, 3, 4, 5]
+CLASS_LABELS = ['C1-C4', 'C5-C13', 'C14-C40', 'C40-C100']
+# 重复模拟支持的视图
+ENSEMBLE_VIEWS = [(count_type, organic_type) for count_type in ('含量', '数量')
+                  for organic_type in ('有机物', '无机物', '有机物分类', '总分子个数')]
+
+
+def t_critical(n: int) -> float:
+    """
+    n个样本均值的95%置信区间对应的t值
+    """
+    return T95[n - 1] if n - 1 < len(T95) else Z95
+
+
+class BandData:
+    def __init__(self, mean: np.ndarray, std: np.ndarray, lower: np.ndarray, upper: np.ndarray, label: str):
+        self.data = mean  # 与LineData一致, data为折线本身
+        self.std = std
+        self.lower = lower
+        self.upper = upper
+        self.label = label
+
+
+def load_replicas(paths: List[str], footstep=1, use_cache=True, sparse=False, workers=None, progress=None,
+                  time_range=None, stride=1) -> List[TableData]:
+    """
+    用进程池并行读取多个重复模拟
+    :param paths: species文件路径
+    :param footstep: 步长
+    :param use_cache: 是否使用磁盘缓存
+    :param sparse: 是否以稀疏矩阵存储物种数量
+    :param workers: 进程数, 默认为CPU核数(见 data.default_workers)与文件数中的较小值
+    :param progress: 进度回调, 每读完一个文件调用一次, 见 data.parse_file
+    :param time_range: 只读取该时间范围(ps)内的帧, 见 TableData
+    :param stride: 帧间隔
+    :return: 与paths顺序一致的TableData
+    """
+    sizes = [os.path.getsize(path) for path in paths]
+    workers = min(workers or default_workers(), len(paths))
+    replicas = [None] * len(paths)
+    with profiler.phase('读取'), ProcessPoolExecutor(max_workers=workers) as executor:
+        # 文件之间已经并行, 单个文件不再多进程解析
+        timesteps = time_to_timesteps(time_range, footstep)
+        futures = {executor.submit(load_table, path, use_cache, 1, sparse, None, timesteps, stride): i
+                   for i, path in enumerate(paths)}
+        try:
+            done = frames = 0
+            for future in as_completed(futures):
+                i = futures[future]
+                replicas[i] = TableData(paths[i], footstep, table=future.result())
+                done += sizes[i]
+                frames += replicas[i].rows
+                if progress is not None:
+                    progress(done, sum(sizes), frames)
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+    return replicas
+
+
+class Ensemble:
+    """
+    同一条件下多个重复模拟的统计.
+    各重复模拟按共同覆盖的时间范围对齐到同一时间网格, 只取需要显示的物种,
+    堆叠为 重复模拟 × 帧 × 物种 的数组后一次计算均值、标准差和95%置信区间.
+    """
+
+    def __init__(self, replicas: List[TableData]):
+        if len(replicas) < 2:
+            raise ValueError("重复模拟至少需要两个文件")
+        self.replicas = replicas
+        self.index_col = 'Timestep'
+        self.y: List[BandData] = list()
+
+        # 公共网格取帧数最多的重复模拟在共同时间范围内的时间点
+        times = [replica._time[:replica.rows] for replica in replicas]
+        start = max(t[0] for t in times)
+        end = min(t[-1] for t in times)
+        if start > end:
+            raise ValueError("重复模拟的时间范围没有重叠")
+        longest = max(times, key=len)
+        self.time = longest[(longest >= start) & (longest <= end)]
+        self.x = self.time
+        # 每个重复模拟在网格各时间点取不晚于该时刻的最后一帧
+        self._rows = [np.maximum(np.searchsorted(t, self.time, 'right') - 1, 0) for t in times]
+
+    def set_x_temp(self, initial_temp, heating_rate):
+        self.x = float(initial_temp) + float(heating_rate) * self.time
+        self.index_col = 'Temperature'
+
+    def _stack(self, values) -> np.ndarray:
+        """
+        按公共网格对齐各重复模拟
+        :param values: values(replica) 返回该重复模拟 帧 × k 的数值
+        :return: 重复模拟 × 帧 × k
+        """
+        result = None
+        for i, (replica, rows) in enumerate(zip(self.replicas, self._rows)):
+            value = np.asarray(values(replica), dtype=np.float64)
+            if result is None:
+                result = np.empty((len(self.replicas), len(rows), value.shape[1]), dtype=np.float64)
+            result[i] = value[rows]
+        return result
+
+    @staticmethod
+    def statistics(stack: np.ndarray):
+        """
+        沿重复模拟方向计算均值、标准差及95%置信区间
+        :param stack: 重复模拟 × 帧 × k
+        :return: (均值, 标准差, 下限, 上限), 均为 帧 × k
+        """
+        n = stack.shape[0]
+        mean = stack.mean(axis=0)
+        std = stack.std(axis=0, ddof=1)
+        half = t_critical(n) * std / np.sqrt(n)
+        return mean, std, mean - half, mean + half
+
+    def species_names(self, organic=True) -> List[str]:
+        """
+        任一重复模拟中出现过的有机物或无机物, 按首次出现的顺序
+        """
+        names = dict()
+        for replica in self.replicas:
+            for name in (replica.organic_columns if organic else replica.non_organic_columns):
+                names.setdefault(name, None)
+        return list(names)
+
+    def species_scores(self, names: List[str], rank_by='peak') -> np.ndarray:
+        """
+        各物种排序依据在重复模拟间的平均值, 未出现的重复模拟记为0
+        """
+        scores = np.zeros(len(names), dtype=np.float64)
+        position = {name: i for i, name in enumerate(names)}
+        for replica in self.replicas:
+            replica_scores = replica.species_scores(rank_by)
+            for name, j in replica.species_index.items():
+                if name in position:
+                    scores[position[name]] += replica_scores[j]
+        return scores / len(self.replicas)
+
+    def _species_values(self, replica: TableData, names: List[str], total_col: int, others: bool, content: bool):
+        # 只展开选中的物种, 未出现的物种为0
+        present = [i for i, name in enumerate(names) if name in replica.species_index]
+        values = np.zeros((replica.rows, len(names) + others), dtype=np.float64)
+        if present:
+            ids = np.array([replica.species_index[names[i]] for i in present], dtype=np.intp)
+            values[:, present] = replica.counts[:, ids]
+        total = replica._class_counts[:replica.rows, total_col]
+        if others:
+            values[:, -1] = total - values[:, :-1].sum(axis=1)
+        return percentages(values, total) if content else values
+
+    def view(self, count_type, organic_type, top_n=None, rank_by='peak', smooth=None, window=SMOOTH_WINDOW,
+             rate=False) -> pd.DataFrame:
+        """
+        计算 (含量类型, 有机物类型) 对应视图的统计带, 结果存入self.y
+        :param smooth: 平滑方法, 先对各重复模拟分别平滑(或求变化速率)再统计, 见 smoothing.transform
+        :param window: 平滑窗口帧数
+        :param rate: 是否统计对x轴的变化速率
+        :return: 各列均值、标准差及置信区间上下限
+        """
+        if (count_type, organic_type) not in ENSEMBLE_VIEWS:
+            raise ValueError(f"重复模拟不支持 {count_type}/{organic_type}, "
+                             f"只支持 含量、数量 的 有机物、无机物、有机物分类、总分子个数")
+        with profiler.phase('视图'):
+            content = count_type == '含量'
+
+            if organic_type in ('有机物', '无机物'):
+                organic = organic_type == '有机物'
+                labels = self.species_names(organic)
+                others = False
+                if top_n is not None and top_n < len(labels):
+                    order = np.argsort(-self.species_scores(labels, rank_by), kind='stable')
+                    labels = [labels[i] for i in order[:top_n]]
+                    others = True
+                total_col = 0 if organic else 1
+                stack = self._stack(lambda replica: self._species_values(replica, labels, total_col, others, content))
+                if others:
+                    labels = labels + [OTHERS_LABEL]
+            elif organic_type == '有机物分类':
+                labels = CLASS_LABELS
+
+                def values(replica):
+                    counts = replica._class_counts[:replica.rows]
+                    return percentages(counts[:, CLASS_COLUMNS], counts[:, 0]) if content else counts[:, CLASS_COLUMNS]
+
+                stack = self._stack(values)
+            else:
+                labels = ['No_Moles']
+                stack = self._stack(lambda replica: replica.df[['No_Moles']].to_numpy())
+
+            if smooth is not None or rate:
+                stack = smoothing.transform(stack, self.x, smooth, window, rate, axis=1)
+            mean, std, lower, upper = self.statistics(stack)
+            self.y = [BandData(mean[:, k], std[:, k], lower[:, k], upper[:, k], label)
+                      for k, label in enumerate(labels)]
+            return self.to_frame()
+
+    def to_frame(self) -> pd.DataFrame:
+        columns: Dict[str, np.ndarray] = {self.index_col: np.asarray(self.x)}
+        for band in self.y:
+            columns[f'{band.label}_mean'] = band.data
+            columns[f'{band.label}_std'] = band.std
+            columns[f'{band.label}_lower'] = band.lower
+            columns[f'{band.label}_upper'] = band.upper
+        return pd.DataFrame(columns)
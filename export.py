@@ -0,0 +1,249 @@
+import copy
+import os
+import re
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+import xlsxwriter
+
+import profiler
+from data import VIEWS, TableData
+from smoothing import SMOOTH_WINDOW
+
+# Excel单个工作表的行数、列数上限
+EXCEL_MAX_ROWS = 1048576
+EXCEL_MAX_COLUMNS = 16384
+# 工作表名最长31个字符, 且不能含有以下字符
+SHEET_NAME_LENGTH = 31
+SHEET_NAME_INVALID = re.compile(r'[\[\]:*?/\\]')
+# 写xlsx时每次转换为Python对象的行数
+WRITE_CHUNK_ROWS = 4096
+# 扩展名 -> 导出格式
+EXPORT_FORMATS = {'.xlsx': 'xlsx', '.csv': 'csv', '.parquet': 'parquet', '.h5': 'hdf5', '.hdf5': 'hdf5'}
+# 文件对话框的过滤器
+EXPORT_FILTER = "Excel Files (*.xlsx);;CSV (*.csv);;Parquet (*.parquet);;HDF5 (*.h5 *.hdf5)"
+
+
+def export_format(path: str) -> str:
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in EXPORT_FORMATS:
+        raise ValueError(f"不支持的导出格式: {ext or path}, 可选 {', '.join(EXPORT_FORMATS)}")
+    return EXPORT_FORMATS[ext]
+
+
+def dense(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    将稀疏列转为普通列, 只转换传入的部分
+    """
+    sparse_columns = {col: dtype.subtype for col, dtype in df.dtypes.items() if isinstance(dtype, pd.SparseDtype)}
+    return df.astype(sparse_columns) if sparse_columns else df
+
+
+class SheetPart:
+    """
+    工作表中的一部分数据, 写入时按块取出, 不复制整张表.
+    transpose 为 False 时为 df 的 rows 行、columns 列; 为 True 时每行为 df 的一列(物种), 首列为列名
+    """
+
+    def __init__(self, df: pd.DataFrame, rows: range, columns: List[int], transpose=False):
+        self.df = df
+        self.rows = rows
+        self.columns = columns
+        self.transpose = transpose
+
+    def __len__(self):
+        return len(self.columns) if self.transpose else len(self.rows)
+
+    def header(self) -> list:
+        if self.transpose:
+            index = self.df.iloc[self.rows, 0]
+            return [str(self.df.columns[0])] + index.tolist()
+        return [str(self.df.columns[i]) for i in self.columns]
+
+    def blocks(self):
+        """
+        依次返回 (起始行, 各行数值)
+        """
+        for start in range(0, len(self), WRITE_CHUNK_ROWS):
+            if self.transpose:
+                ids = self.columns[start:start + WRITE_CHUNK_ROWS]
+                block = dense(self.df.iloc[self.rows, ids]).to_numpy().T
+                names = np.array([str(self.df.columns[i]) for i in ids], dtype=object)[:, None]
+                yield start, _cells(block, names)
+            else:
+                rows = self.rows[start:start + WRITE_CHUNK_ROWS]
+                block = dense(self.df.iloc[rows.start:rows.stop, self.columns]).to_numpy()
+                yield start, _cells(block)
+
+
+def _cells(block: np.ndarray, first_column: np.ndarray = None) -> list:
+    # 缺失值写为空白单元格; xlsxwriter 不能写入无穷大, 与 pandas 导出时一样写为 inf/-inf
+    if block.dtype.kind == 'f':
+        missing = np.isnan(block)
+        infinite = np.isinf(block)
+        if missing.any() or infinite.any():
+            values = block
+            block = block.astype(object)
+            block[missing] = None
+            block[infinite] = np.where(values[infinite] > 0, 'inf', '-inf')
+    if first_column is not None:
+        block = np.hstack([first_column, block.astype(object)])
+    return block.tolist()
+
+
+def split_table(df: pd.DataFrame, wide='split') -> List[SheetPart]:
+    """
+    按Excel单表上限拆分
+    :param df: 第一列为索引列(时间或温度)的表
+    :param wide: 列数超限时的处理方式, split 按列拆分并在每部分重复索引列, transpose 转置为每个物种一行
+    :return: 各部分
+    """
+    rows, columns = df.shape
+    height = EXCEL_MAX_ROWS - 1  # 第一行为表头
+    width = EXCEL_MAX_COLUMNS - 1  # 每部分都保留索引列
+    if wide == 'transpose' and columns > EXCEL_MAX_COLUMNS and rows <= width:
+        species = list(range(1, columns))
+        return [SheetPart(df, range(rows), species[start:start + height], transpose=True)
+                for start in range(0, len(species), height)]
+
+    if columns <= EXCEL_MAX_COLUMNS:
+        column_groups = [list(range(columns))]
+    else:
+        column_groups = [[0] + list(range(start, min(start + width, columns))) for start in range(1, columns, width)]
+    return [SheetPart(df, range(start, min(start + height, rows)), group)
+            for group in column_groups for start in range(0, max(rows, 1), height)]
+
+
+def sheet_names(name: str, count: int, used: set) -> List[str]:
+    """
+    生成合法且不重复的工作表名, 拆分为多个部分时依次加上序号
+    """
+    base = SHEET_NAME_INVALID.sub('_', str(name)) or 'Sheet'
+    names = []
+    for i in range(count):
+        suffix = f'_{i + 1}' if count > 1 else ''
+        candidate, n = base[:SHEET_NAME_LENGTH - len(suffix)] + suffix, 1
+        while candidate.lower() in used:
+            n += 1
+            tail = f'{suffix}~{n}'
+            candidate = base[:SHEET_NAME_LENGTH - len(tail)] + tail
+        used.add(candidate.lower())
+        names.append(candidate)
+    return names
+
+
+def write_excel(path: str, tables: Dict[str, pd.DataFrame], wide='split', progress=None):
+    """
+    以xlsxwriter的constant_memory模式逐行写入, 内存占用与表的大小无关
+    :param path: 文件路径
+    :param tables: {工作表名: 表}
+    :param wide: 列数超过Excel上限时的处理方式, 见 split_table
+    :param progress: 进度回调 progress(已写行数, 总行数, 已写行数)
+    """
+    sheets = []
+    used = set()
+    for name, df in tables.items():
+        parts = split_table(df, wide)
+        sheets.extend(zip(sheet_names(name, len(parts), used), parts))
+    total = sum(len(part) for _, part in sheets)
+    done = 0
+
+    workbook = xlsxwriter.Workbook(path, {'constant_memory': True})
+    try:
+        header_format = workbook.add_format({'bold': True, 'border': 1, 'align': 'center', 'valign': 'top'})
+        for sheet_name, part in sheets:
+            worksheet = workbook.add_worksheet(sheet_name)
+            worksheet.write_row(0, 0, part.header(), header_format)
+            for start, cells in part.blocks():
+                for i, row in enumerate(cells, start + 1):
+                    worksheet.write_row(i, 0, row)
+                done += len(cells)
+                if progress is not None:
+                    progress(done, total, done)
+    except BaseException:
+        workbook.close()
+        os.remove(path)  # 取消或出错时不留下写了一半的文件
+        raise
+    workbook.close()
+
+
+def write_tables(path: str, tables: Dict[str, pd.DataFrame], wide='split', progress=None) -> List[str]:
+    """
+    按扩展名导出为 xlsx、csv、parquet 或 hdf5.
+    xlsx 每个表一个工作表, hdf5 每个表一个键; csv 和 parquet 有多个表时每个表一个文件, 文件名加上表名
+    :param path: 文件路径
+    :param tables: {表名: 表}
+    :param wide: 列数超过Excel上限时的处理方式, 见 split_table
+    :param progress: 进度回调, 见 write_excel
+    :return: 写出的文件
+    """
+    with profiler.phase('导出'):
+        fmt = export_format(path)
+        if fmt == 'xlsx':
+            write_excel(path, tables, wide, progress)
+            return [path]
+
+        if fmt == 'hdf5' and os.path.exists(path):
+            os.remove(path)  # 与其他格式一致, 覆盖已有文件
+        stem, ext = os.path.splitext(path)
+        total = sum(len(df) for df in tables.values())
+        done = 0
+        written = []
+        for name, df in tables.items():
+            target = path if len(tables) == 1 or fmt == 'hdf5' else f'{stem}_{name}{ext}'
+            if target not in written:
+                written.append(target)
+            try:
+                if fmt == 'csv':
+                    df.to_csv(target, index=False, chunksize=WRITE_CHUNK_ROWS)
+                elif fmt == 'parquet':
+                    dense(df).to_parquet(target, index=False)
+                else:
+                    dense(df).to_hdf(target, key=name, mode='a')
+                done += len(df)
+                if progress is not None:
+                    progress(done, total, done)
+            except BaseException:
+                for file in written:  # 取消或出错时不留下不完整的导出
+                    if os.path.exists(file):
+                        os.remove(file)
+                raise
+        return written
+
+
+def view_tables(data, top_n=None, rank_by='peak', views=None, temperature=None, smooth=None, window=SMOOTH_WINDOW,
+                rate=False) -> Tuple[Dict[str, pd.DataFrame], Dict[str, str]]:
+    """
+    一次计算多个视图, 各视图共用数据中已缓存的中间结果, 不修改data本身的x/y
+    :param data: TableData 或 ensemble.Ensemble
+    :param top_n: 只导出排名前N的物种
+    :param rank_by: 物种排序依据
+    :param views: [(含量类型, 有机物类型)], 默认为全部视图
+    :param temperature: (初始温度, 升温速率), 给出时以温度为x轴
+    :param smooth: 折线视图的平滑方法, 见 smoothing.SMOOTH_METHODS
+    :param window: 平滑窗口帧数
+    :param rate: 折线视图是否导出变化速率
+    :return: ({含量类型-有机物类型: 表}, {含量类型-有机物类型: 无法计算的原因})
+    """
+    if isinstance(data, TableData):
+        data = data.clone()
+        compute = lambda key: data.view(*key, top_n=top_n, rank_by=rank_by, smooth=smooth, window=window, rate=rate)[1]
+        default_views = list(VIEWS)
+    else:
+        from ensemble import ENSEMBLE_VIEWS
+        data = copy.copy(data)
+        compute = lambda key: data.view(*key, top_n=top_n, rank_by=rank_by, smooth=smooth, window=window, rate=rate)
+        default_views = ENSEMBLE_VIEWS
+
+    if temperature is not None:
+        data.set_x_temp(*temperature)
+
+    tables, errors = dict(), dict()
+    for key in views or default_views:
+        name = '-'.join(key)
+        try:
+            tables[name] = compute(key)
+        except ValueError as e:  # 含未知元素时无法计算质量百分比
+            errors[name] = str(e)
+    return tables, errors
@@ -0,0 +1,77 @@
+import json
+import os
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+from matplotlib import font_manager
+
+from cache import cache_dir
+
+# 优先使用的中文字体文件名
+CHINESE_FONTS = ('SimSun', 'msyh.ttc')
+# 字体查找结果的缓存文件名
+FONT_CACHE_NAME = 'fonts.json'
+
+
+def font_directories() -> List[str]:
+    """
+    系统字体目录, 与matplotlib查找字体的目录一致
+    """
+    if os.name == 'nt':
+        dirs = [os.path.join(os.environ.get('WINDIR', r'C:\Windows'), 'Fonts'),
+                os.path.join(os.environ.get('LOCALAPPDATA', ''), 'Microsoft', 'Windows', 'Fonts')]
+    else:
+        dirs = font_manager.X11FontDirectories + font_manager.OSXFontDirectories
+    return [path for path in dirs if os.path.isdir(path)]
+
+
+def font_signature() -> Dict[str, int]:
+    # 安装或删除字体后所在目录的修改时间会变化, 缓存随之失效. 字体常装在子目录中(如 truetype/<包名>), 子目录也要记录
+    signature = dict()
+    for top in font_directories():
+        for path, _, _ in os.walk(top):
+            try:
+                signature[path] = os.stat(path).st_mtime_ns
+            except OSError:
+                pass
+    return signature
+
+
+def find_chinese_font() -> Optional[str]:
+    """
+    扫描系统中的全部字体, 返回找到的第一个中文字体, 字体很多时需要数秒
+    """
+    font_list = font_manager.findSystemFonts(fontpaths=None, fontext='ttf')
+    chinese_fonts = [f for f in font_list if any(name in f for name in CHINESE_FONTS)]
+    return chinese_fonts[0] if chinese_fonts else None
+
+
+@lru_cache(maxsize=None)
+def chinese_font_path() -> Optional[str]:
+    """
+    中文字体路径, 每个进程只查找一次, 查找结果保存在缓存目录中供下次启动直接使用
+    :return: 字体文件路径, 没有中文字体时为None
+    """
+    path = os.path.join(cache_dir(), FONT_CACHE_NAME)
+    signature = font_signature()
+    try:
+        with open(path, encoding='utf-8') as file:
+            cached = json.load(file)
+        font = cached['font']
+        if cached['signature'] == signature and (font is None or os.path.exists(font)):
+            return font
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+
+    font = find_chinese_font()
+    # 先写临时文件再替换, 写入失败时忽略
+    tmp_path = path + '.tmp'
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump({'font': font, 'signature': signature}, file, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return font
@@ -0,0 +1,258 @@
+import argparse
+import sys
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+import profiler
+import smoothing
+from data import TableData
+from smoothing import SMOOTH_METHODS, SMOOTH_WINDOW
+
+# 气体常数 J/(mol·K)
+GAS_CONSTANT = 8.314462618
+# 时间单位为ps, 速率常数换算为 1/s 的倍数
+PER_PS_TO_PER_S = 1e12
+# 反应物从首次达到峰值该比例的帧开始拟合, 避免噪声使峰值帧偏后
+PEAK_FRACTION = 0.9
+# 自动判断类型时比较最前和最后该比例帧的平均数量
+EDGE_FRACTION = 0.1
+# 拟合窗口内的最少点数, 不足时结果为NaN
+MIN_FIT_POINTS = 5
+# 每次处理的 帧 × 物种 单元数, 限制中间数组的内存
+FIT_CHUNK_CELLS = 1 << 22
+# 拟合类型
+FIT_KINDS = ['auto', 'decay', 'formation']
+# 拟合结果的列
+FIT_COLUMNS = ['species', 'kind', 'k', 'r2', 'points', 'start', 'end', 'amplitude']
+
+
+def linear_fit(x: np.ndarray, y: np.ndarray, mask: np.ndarray):
+    """
+    对每一列分别做 y = a + b x 的最小二乘拟合, 只使用mask为True的点, 全部列用矩阵乘法一次求出
+    :param x: 长度为帧数的自变量
+    :param y: 帧 × 列 的因变量
+    :param mask: 帧 × 列, 参与拟合的点
+    :return: (斜率, 截距, R², 点数), 均为长度为列数的数组, 点数不足两个时为NaN
+    """
+    x = np.asarray(x, dtype=np.float64)
+    center = x.mean() if len(x) else 0.0
+    x = x - center  # 先居中, 避免大数相减损失精度
+    weights = mask.astype(np.float64)
+    y = np.where(mask, y, 0.0)
+    n = weights.sum(axis=0)
+    sx, sxx = x @ weights, (x * x) @ weights
+    sy, syy, sxy = y.sum(axis=0), (y * y).sum(axis=0), x @ y
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sxx_c = sxx - sx * sx / n
+        syy_c = syy - sy * sy / n
+        sxy_c = sxy - sx * sy / n
+        slope = sxy_c / sxx_c
+        intercept = (sy - slope * sx) / n - slope * center
+        r2 = np.where(syy_c > 0, sxy_c * sxy_c / (sxx_c * syy_c), 1.0)
+    invalid = (n < 2) | ~(sxx_c > 0)
+    slope[invalid] = intercept[invalid] = r2[invalid] = np.nan
+    return slope, intercept, r2, n
+
+
+def integral_fit(time: np.ndarray, values: np.ndarray, mask: np.ndarray, with_time: bool):
+    """
+    一级反应的积分法拟合, 全部列一次求出.
+    dN/dt = -k N (+ k N∞) 积分后为 N = c (+ a t) - k ∫N dt, 对 ∫N dt (及 t) 做线性最小二乘, 不需要预先知道 N∞,
+    积分同时平滑了计数噪声, 数量为0的帧也可以直接使用
+    :param time: 各帧的时间
+    :param values: 帧 × 列 的数量
+    :param mask: 帧 × 列, 参与拟合的点
+    :param with_time: 是否包含 a t 项(产物生成)
+    :return: (k, a, R², 点数)
+    """
+    weights = mask.astype(np.float64)
+    n = weights.sum(axis=0)
+    # 累积梯形积分, 各列从第一帧开始, 常数偏移由截距吸收
+    integral = np.empty_like(values)
+    integral[0] = 0
+    np.cumsum((values[1:] + values[:-1]) * (np.diff(time)[:, None] / 2), axis=0, out=integral[1:])
+    # 与时间有关的和用矩阵乘法求出, 时间先整体居中
+    time = time - time.mean()
+    weighted_integral, weighted_values = integral * weights, values * weights
+    with np.errstate(divide='ignore', invalid='ignore'):
+        st, si, sy = time @ weights, weighted_integral.sum(axis=0), weighted_values.sum(axis=0)
+        # 各项减去均值后的平方和及交叉乘积和
+        stt = (time * time) @ weights - st * st / n
+        sti = time @ weighted_integral - st * si / n
+        sty = time @ weighted_values - st * sy / n
+        sii = (weighted_integral * integral).sum(axis=0) - si * si / n
+        siy = (weighted_integral * values).sum(axis=0) - si * sy / n
+        syy = (weighted_values * values).sum(axis=0) - sy * sy / n
+        if with_time:
+            det = stt * sii - sti * sti
+            a = (sty * sii - siy * sti) / det
+            b = (siy * stt - sty * sti) / det
+            explained = a * sty + b * siy
+            invalid = (n < 3) | ~(np.abs(det) > 0)
+        else:
+            a = np.zeros_like(n)
+            b = siy / sii
+            explained = b * siy
+            invalid = (n < 2) | ~(sii > 0)
+        r2 = np.where(syy > 0, explained / syy, 1.0)
+    k = -b
+    k[invalid] = a[invalid] = r2[invalid] = np.nan
+    return k, a, r2, n
+
+
+def _fit_chunk(time: np.ndarray, values: np.ndarray, kind: str, min_points: int) -> Dict[str, np.ndarray]:
+    """
+    一批物种的一级反应拟合
+    :param time: 各帧的时间(ps)
+    :param values: 帧 × 物种 的数量
+    :param kind: auto、decay 或 formation
+    :param min_points: 最少点数
+    :return: 各结果列
+    """
+    frames, count = values.shape
+    frame = np.arange(frames)[:, None]
+    edge = max(1, int(frames * EDGE_FRACTION))
+    if kind == 'auto':
+        decay = values[:edge].mean(axis=0) > values[-edge:].mean(axis=0)
+    else:
+        decay = np.full(count, kind == 'decay')
+
+    # 反应物从接近峰值处拟合到最后, 产物从第一帧拟合到峰值
+    peak_frame = values.argmax(axis=0)
+    peak = values[peak_frame, np.arange(count)]
+    decay_start = (values >= peak * PEAK_FRACTION).argmax(axis=0)
+    decay_mask = frame >= decay_start
+    formation_mask = frame <= peak_frame
+
+    result = {name: np.full(count, np.nan) for name in ['k', 'r2', 'points', 'start', 'end', 'amplitude']}
+    for selected, mask, with_time in ((decay, decay_mask, False), (~decay, formation_mask, True)):
+        if not selected.any():
+            continue
+        k, a, r2, points = integral_fit(time, values[:, selected], mask[:, selected], with_time)
+        columns = np.flatnonzero(selected)
+        window = np.where(mask[:, selected], time[:, None], np.nan)
+        too_few = points < min_points
+        result['k'][columns] = np.where(too_few, np.nan, k)
+        result['r2'][columns] = np.where(too_few, np.nan, r2)
+        result['points'][columns] = points
+        result['start'][columns] = np.nanmin(window, axis=0)
+        result['end'][columns] = np.nanmax(window, axis=0)
+        # 反应物为起始数量, 产物为 N∞ = a / k
+        with np.errstate(divide='ignore', invalid='ignore'):
+            result['amplitude'][columns] = a / k if with_time else peak[selected]
+    result['points'] = result['points'].astype(np.int64)
+    result['kind'] = np.where(decay, 'decay', 'formation')
+    return result
+
+
+def fit_first_order(data: TableData, species: List[str] = None, kind='auto', smooth=None, window=SMOOTH_WINDOW,
+                    min_points=MIN_FIT_POINTS) -> pd.DataFrame:
+    """
+    等温热解中逐个物种的一级反应速率常数, 全部物种按块一次拟合.
+    反应物按 dN/dt = -k N 拟合峰值之后的衰减段, 产物按 dN/dt = k (N∞ - N) 拟合峰值之前的生成段, 见 integral_fit
+    :param data: TableData, 以时间(ps)为自变量
+    :param species: 要拟合的物种, 默认为全部物种
+    :param kind: decay 反应物, formation 产物, auto 按最前和最后各 EDGE_FRACTION 帧的平均数量自动判断
+    :param smooth: 拟合前的平滑方法, 见 smoothing.SMOOTH_METHODS
+    :param window: 平滑窗口帧数
+    :param min_points: 拟合窗口内的最少点数, 不足时k和R²为NaN
+    :return: 每个物种一行: 类型、k(1/ps)、R²、点数、拟合窗口起止时间(ps)、反应物的峰值或产物的 N∞
+    """
+    if kind not in FIT_KINDS:
+        raise ValueError(f"未知的拟合类型: {kind}, 可选 {', '.join(FIT_KINDS)}")
+    species = list(data.species if species is None else species)
+    ids = np.array([data.species_index[name] for name in species], dtype=np.intp)
+    time = data._time[:data.rows]
+
+    columns = {name: [] for name in FIT_COLUMNS[1:]}
+    with profiler.phase('拟合'):
+        step = max(1, FIT_CHUNK_CELLS // max(data.rows, 1))
+        for start in range(0, len(ids), step):
+            values = np.asarray(data.counts[:, ids[start:start + step]], dtype=np.float64)
+            if smooth is not None:
+                values = smoothing.transform(values, time, smooth, window)
+            for name, value in _fit_chunk(time, values, kind, min_points).items():
+                columns[name].append(value)
+    result = pd.DataFrame({name: np.concatenate(value) if value else [] for name, value in columns.items()})
+    result.insert(0, 'species', species)
+    return result
+
+
+def arrhenius(fits: Dict[float, pd.DataFrame], min_r2=0.0, min_runs=2) -> pd.DataFrame:
+    """
+    用不同温度下的速率常数按 ln k = ln A - Ea / (R T) 拟合, 全部物种一次计算
+    :param fits: {温度(K): fit_first_order 的结果}
+    :param min_r2: 只使用R²不低于该值的速率常数
+    :param min_runs: 至少需要的温度数, 不足时Ea和A为NaN
+    :return: 每个 (物种, 类型) 一行: Ea(kJ/mol)、A(1/s)、R²、使用的温度数
+    """
+    temperatures = np.array(sorted(fits), dtype=np.float64)
+    if len(temperatures) < 2:
+        raise ValueError("Arrhenius拟合至少需要两个温度")
+    table = pd.concat([fits[t].set_index(['species', 'kind'])[['k', 'r2']] for t in temperatures], axis=1,
+                      keys=range(len(temperatures)))
+    k = table.xs('k', axis=1, level=1).to_numpy(dtype=np.float64).T  # 温度 × (物种, 类型)
+    r2 = table.xs('r2', axis=1, level=1).to_numpy(dtype=np.float64).T
+    with np.errstate(invalid='ignore'):
+        mask = (k > 0) & (r2 >= min_r2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope, intercept, fit_r2, runs = linear_fit(1 / temperatures, np.log(k), mask)
+    too_few = runs < max(min_runs, 2)
+    result = pd.DataFrame({
+        'Ea': np.where(too_few, np.nan, -slope * GAS_CONSTANT / 1000),
+        'A': np.where(too_few, np.nan, np.exp(intercept) * PER_PS_TO_PER_S),
+        'r2': np.where(too_few, np.nan, fit_r2),
+        'runs': runs.astype(np.int64),
+    }, index=table.index).reset_index()
+    return result
+
+
+def fit_runs(runs: Dict[float, TableData], min_r2=0.0, **fit_args):
+    """
+    对多个温度下的等温热解分别拟合, 再合并为Arrhenius参数
+    :param runs: {温度(K): TableData}
+    :param min_r2: 见 arrhenius
+    :param fit_args: 见 fit_first_order
+    :return: ({温度: 拟合结果}, Arrhenius参数)
+    """
+    fits = {temperature: fit_first_order(data, **fit_args) for temperature, data in runs.items()}
+    return fits, arrhenius(fits, min_r2)
+
+
+def main(argv=None):
+    from export import write_tables
+
+    parser = argparse.ArgumentParser(description="等温热解的一级反应速率常数拟合, 给出多个温度时同时拟合Arrhenius参数")
+    parser.add_argument('inputs', nargs='+', help="species文件, 每个温度一个")
+    parser.add_argument('-T', '--temperatures', nargs='+', type=float, help="各文件的温度(K), 与文件顺序一致")
+    parser.add_argument('-o', '--output', required=True, help="导出文件, 扩展名决定格式, 见 export.EXPORT_FORMATS")
+    parser.add_argument('-s', '--footstep', type=float, default=1, help="步长(fs), 默认为1")
+    parser.add_argument('-k', '--kind', default='auto', choices=FIT_KINDS, help="拟合类型, 默认自动判断")
+    parser.add_argument('--smooth', choices=list(SMOOTH_METHODS), help="拟合前的平滑方法")
+    parser.add_argument('--window', type=int, default=SMOOTH_WINDOW, help=f"平滑窗口帧数, 默认为{SMOOTH_WINDOW}")
+    parser.add_argument('--min-points', type=int, default=MIN_FIT_POINTS, help="拟合窗口内的最少点数")
+    parser.add_argument('--min-r2', type=float, default=0.0, help="Arrhenius拟合只使用R²不低于该值的速率常数")
+    args = parser.parse_args(argv)
+
+    temperatures = args.temperatures or [None] * len(args.inputs)
+    if len(temperatures) != len(args.inputs):
+        parser.error("温度个数应与文件个数一致")
+    if args.temperatures and len(set(args.temperatures)) != len(args.temperatures):
+        parser.error("温度不能重复")
+    fit_args = dict(kind=args.kind, smooth=args.smooth, window=args.window, min_points=args.min_points)
+    fits = {}
+    for i, (path, temperature) in enumerate(zip(args.inputs, temperatures)):
+        key = temperature if temperature is not None else i
+        fits[key] = fit_first_order(TableData(path, args.footstep), **fit_args)
+    tables = {f'{key:g}K' if args.temperatures else f'run{key + 1}': fit for key, fit in fits.items()}
+    if args.temperatures and len(fits) > 1:
+        tables['Arrhenius'] = arrhenius(fits, args.min_r2)
+    written = write_tables(args.output, tables)
+    print(f"已导出 {', '.join(written)}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
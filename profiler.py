@@ -0,0 +1,199 @@
+import contextlib
+import json
+import os
+import threading
+import time
+import tracemalloc
+from typing import Dict, List, Optional
+
+# 环境变量 QTDATAANALYSE_PROFILE 开启性能分析: 1 记录时间和内存峰值, time 只记录时间(不受tracemalloc拖慢);
+# 同时设置 QTDATAANALYSE_TRACE 时把各阶段写入该路径的Chrome trace文件, 可在 chrome://tracing 或 Perfetto 中查看
+PROFILE_ENV = 'QTDATAANALYSE_PROFILE'
+TRACE_ENV = 'QTDATAANALYSE_TRACE'
+
+_enabled = False
+_memory = False
+_trace_path: Optional[str] = None
+_events: List[dict] = list()
+_lock = threading.Lock()
+_local = threading.local()
+_origin = time.perf_counter()
+_NULL = contextlib.nullcontext()
+
+
+class Phase:
+    def __init__(self, name: str, depth: int, start: float):
+        self.name = name
+        self.depth = depth  # 嵌套层数, 0为最外层
+        self.start = start
+        self.thread = threading.get_ident()
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.peak: Optional[int] = None  # 阶段内比开始时多占用的内存峰值(字节)
+
+
+class Session:
+    """
+    一次刷新(或导出)中各阶段的记录, 阶段可能分布在后台线程和主线程中
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.phases: List[Phase] = list()
+        self._lock = threading.Lock()
+
+    def add(self, phase: Phase):
+        with self._lock:
+            self.phases.append(phase)
+
+    def totals(self) -> Dict[str, Phase]:
+        """
+        按名称合并最外层的阶段
+        """
+        totals: Dict[str, Phase] = dict()
+        for phase in self.phases:
+            if phase.depth:
+                continue
+            total = totals.setdefault(phase.name, Phase(phase.name, 0, phase.start))
+            total.wall += phase.wall
+            total.cpu += phase.cpu
+            if phase.peak is not None:
+                total.peak = max(total.peak or 0, phase.peak)
+        return totals
+
+    def summary(self) -> str:
+        """
+        简短的耗时分布, 用于状态栏
+        """
+        totals = self.totals()
+        parts = [f'{name} {phase.wall * 1000:.0f}ms' for name, phase in totals.items()]
+        wall = sum(phase.wall for phase in totals.values())
+        cpu = sum(phase.cpu for phase in totals.values())
+        text = f"{self.name}: {' | '.join(parts)} | 合计 {wall * 1000:.0f}ms, CPU {cpu * 1000:.0f}ms"
+        peaks = [phase.peak for phase in totals.values() if phase.peak is not None]
+        if peaks:
+            text += f', 峰值 {max(peaks) / (1 << 20):.1f}MB'
+        return text
+
+    def events(self) -> List[dict]:
+        """
+        Chrome trace 格式的完整事件
+        """
+        events = []
+        for phase in self.phases:
+            args = {'session': self.name, 'cpu_ms': round(phase.cpu * 1000, 3)}
+            if phase.peak is not None:
+                args['peak_mb'] = round(phase.peak / (1 << 20), 3)
+            events.append({'name': phase.name, 'cat': 'phase', 'ph': 'X', 'pid': os.getpid(), 'tid': phase.thread,
+                           'ts': round((phase.start - _origin) * 1e6, 1), 'dur': round(phase.wall * 1e6, 1),
+                           'args': args})
+        return events
+
+
+def enable(memory=True, trace_path=None):
+    """
+    开启性能分析
+    :param memory: 是否用tracemalloc记录内存峰值, 会明显拖慢运行; 多个任务同时运行时峰值会相互影响
+    :param trace_path: Chrome trace 文件路径, 为None时不写文件
+    """
+    global _enabled, _memory, _trace_path
+    _enabled, _memory, _trace_path = True, memory, trace_path
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def session(name: str) -> Optional[Session]:
+    """
+    开始一次记录, 未开启性能分析时返回None
+    """
+    return Session(name) if _enabled else None
+
+
+@contextlib.contextmanager
+def _activate(value: Session):
+    previous = getattr(_local, 'session', None)
+    _local.session = value
+    try:
+        yield value
+    finally:
+        _local.session = previous
+
+
+def current() -> Optional[Session]:
+    """
+    当前线程正在记录的会话
+    """
+    return getattr(_local, 'session', None) if _enabled else None
+
+
+def activate(value: Optional[Session]):
+    """
+    在当前线程中把之后的阶段计入value
+    """
+    return _NULL if value is None else _activate(value)
+
+
+@contextlib.contextmanager
+def _phase(value: Session, name: str):
+    stack = _local.__dict__.setdefault('stack', [])
+    phase = Phase(name, len(stack), time.perf_counter())
+    frame = None
+    if _memory and tracemalloc.is_tracing():
+        current, peak = tracemalloc.get_traced_memory()
+        if stack and stack[-1] is not None:  # 重置前先记下外层阶段到目前为止的峰值
+            stack[-1][1] = max(stack[-1][1], peak)
+        tracemalloc.reset_peak()
+        frame = [current, current]  # [开始时占用, 已知的峰值]
+    stack.append(frame)
+    cpu = time.thread_time()
+    try:
+        yield phase
+    finally:
+        phase.wall = time.perf_counter() - phase.start
+        phase.cpu = time.thread_time() - cpu
+        stack.pop()
+        if frame is not None and tracemalloc.is_tracing():
+            peak = max(frame[1], tracemalloc.get_traced_memory()[1])
+            phase.peak = max(peak - frame[0], 0)
+            if stack and stack[-1] is not None:
+                stack[-1][1] = max(stack[-1][1], peak)
+        value.add(phase)
+
+
+def phase(name: str):
+    """
+    记录一个阶段, 未开启性能分析或当前线程没有记录时不做任何事
+    用法: with profiler.phase('解析'): ...
+    """
+    if not _enabled:
+        return _NULL
+    value = getattr(_local, 'session', None)
+    return _NULL if value is None else _phase(value, name)
+
+
+def finish(value: Optional[Session]) -> Optional[str]:
+    """
+    结束一次记录, 设置了trace文件时追加写入
+    :return: 简短的耗时分布, 未开启时为None
+    """
+    if value is None:
+        return None
+    if _trace_path:
+        with _lock:
+            _events.extend(value.events())
+            tmp_path = _trace_path + '.tmp'
+            try:
+                with open(tmp_path, 'w', encoding='utf-8') as file:
+                    json.dump({'traceEvents': _events, 'displayTimeUnit': 'ms'}, file, ensure_ascii=False)
+                os.replace(tmp_path, _trace_path)
+            except OSError:  # 写入失败不影响使用
+                pass
+    return value.summary()
+
+
+if os.environ.get(PROFILE_ENV):
+    enable(memory=os.environ[PROFILE_ENV] != 'time', trace_path=os.environ.get(TRACE_ENV) or None)
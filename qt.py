@@ -1,24 +1,416 @@
+import multiprocessing
 import os
 import subprocess
 import sys
-import matplotlib.pyplot as plt
-import pandas as pd
+import matplotlib
+import numpy as np
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas, NavigationToolbar2QT
-from PyQt5.QtGui import QDoubleValidator
+from PyQt5.QtGui import QDoubleValidator, QIntValidator
 from PyQt5.QtWidgets import QApplication, QLabel, QMainWindow, QTabWidget, QWidget, QVBoxLayout, \
-    QHBoxLayout, QPushButton, QFileDialog, QComboBox, QSplitter, QLineEdit, QMessageBox
-from PyQt5.QtCore import Qt
-import matplotlib.font_manager as font_manager
+    QHBoxLayout, QPushButton, QFileDialog, QComboBox, QSplitter, QLineEdit, QMessageBox, QCheckBox, QProgressBar
+from PyQt5.QtCore import Qt, QTimer, QObject, QRunnable, QThreadPool, pyqtSignal
+from matplotlib.figure import Figure
+from matplotlib.font_manager import FontProperties
+from matplotlib.ticker import AutoLocator, ScalarFormatter
+from matplotlib.collections import PolyCollection
+from matplotlib.transforms import Bbox
 
-from data import TableData
+import profiler
+from decimate import MinMaxPyramid, envelope
+from fonts import chinese_font_path
+from smoothing import SMOOTH_METHODS, SMOOTH_WINDOW
+
+# data、store、ensemble、export 依赖pandas, 在首次加载文件时才导入, 以加快启动
 
 # pyinstaller -F -n 数据分析 --noconsole qt.py
 
+# 跟踪模式刷新间隔(ms)
+FOLLOW_INTERVAL = 2000
+# 物种排序依据: 最大数量、全部帧数量之和、最后一帧数量
+RANK_BY = {'峰值': 'peak', '积分': 'integral', '最终': 'final'}
+# 导出xlsx时列数超过上限的处理方式: 按列拆分为多个工作表、转置为每个物种一行, 见 export.split_table
+WIDE_MODES = {'按列拆分': 'split', '转置': 'transpose'}
+# 平滑方法下拉框中不平滑的选项
+NO_SMOOTH = '不平滑'
+# 折线抽稀时每条线至少保留的点数
+MIN_LOD_POINTS = 2000
+# 选择多个文件(重复模拟)时文件路径之间的分隔符
+FILE_SEPARATOR = ';'
+# 置信区间带的透明度
+BAND_ALPHA = 0.25
+
+# 进度条的刻度数
+PROGRESS_STEPS = 1000
+
+
+def compute_view(task, data, params):
+    """
+    计算视图数据, 在后台线程中执行
+    :param task: 当前任务, 用于检查是否已取消
+    :param data: TableData
+    :param params: 见 TabPage.view_params
+    :return: (data, 柱状图横轴标签, 导出数据), 不支持的组合时导出数据为None
+    """
+    from data import VIEWS
+    from ensemble import Ensemble
+
+    task.check()
+    if params['temperature'] is not None:
+        data.set_x_temp(*params['temperature'])
+    names, export_df = None, None
+    if isinstance(data, Ensemble):
+        export_df = data.view(*params['view'], **params['view_args'])
+    elif params['view'] in VIEWS:
+        names, export_df = data.view(*params['view'], **params['view_args'])
+    else:
+        data.y.clear()
+    task.check()
+    return data, names, export_df
+
+
+class TaskSignals(QObject):
+    progress = pyqtSignal('qint64', 'qint64', 'qint64')  # 已读字节, 总字节, 已解析帧数
+    finished = pyqtSignal(object)  # 计算结果
+    failed = pyqtSignal(object)  # 异常
+
+
+class Task(QRunnable):
+    """
+    线程池中执行的后台任务, 通过信号把进度和结果交回主线程
+    """
+
+    def __init__(self, fn):
+        super().__init__()
+        self.fn = fn
+        self.signals = TaskSignals()
+        self.cancelled = False
+        self.session = None  # 性能分析记录, 未开启时为None
+
+    def cancel(self):
+        self.cancelled = True
+
+    def check(self):
+        if self.cancelled:
+            from data import Cancelled
+            raise Cancelled()
+
+    # 作为解析进度回调, 取消后在下一次报告进度时中止解析
+    def report(self, done, total, frames):
+        self.check()
+        self.signals.progress.emit(done, total, frames)
+
+    def run(self):
+        from data import Cancelled
+
+        try:
+            with profiler.activate(self.session):
+                result = self.fn(self)
+        except Cancelled:
+            self.signals.finished.emit(None)
+        except Exception as e:
+            self.signals.failed.emit(e)
+        else:
+            self.signals.finished.emit(None if self.cancelled else result)
+
+
 class MplCanvas(FigureCanvas):
+    """
+    绘图区域. 刷新时复用已有的折线, 只替换数据;
+    折线、图例和鼠标位置提示为动态元素, 显示/隐藏折线或移动鼠标时只局部重绘(blitting)
+    """
+
     def __init__(self, parent=None, width=5, height=4, dpi=100):
-        fig = plt.Figure(figsize=(width, height), dpi=dpi)
+        fig = Figure(figsize=(width, height), dpi=dpi)
         self.axes = fig.add_subplot(111)
         super(MplCanvas, self).__init__(fig)
+        self.lod_lines = []  # 按显示范围抽稀的折线及其 min/max 金字塔
+        self.bands = dict()  # 折线 -> 重复模拟的置信区间带
+        self.bar_artists = []  # 柱状图的柱子和数值标签
+        self.legend = None
+        self.legend_lines = dict()  # 图例中的线 -> 对应的折线
+        self.background = None  # 不含折线、图例和鼠标提示的画面
+        self.plot_image = None  # 除鼠标提示外的完整画面
+        self.profile = None  # 性能分析时下一次重绘计入的 (记录, 重绘后的回调)
+        # 鼠标所在位置的竖线及坐标
+        self.cursor = self.axes.axvline(np.nan, color='grey', linewidth=0.8, animated=True, visible=False)
+        self.cursor_text = self.axes.text(0.01, 0.99, '', transform=self.axes.transAxes, ha='left', va='top',
+                                          animated=True, visible=False)
+        self.axes.callbacks.connect('xlim_changed', self.on_xlim_changed)
+        self.mpl_connect('draw_event', self.on_draw)
+        self.mpl_connect('pick_event', self.on_pick)
+        self.mpl_connect('motion_notify_event', self.on_hover)
+        self.mpl_connect('axes_leave_event', self.on_leave)
+
+    def max_points(self):
+        # 每个像素最多两个点(桶内最小值和最大值)
+        return max(int(self.axes.bbox.width) * 2, MIN_LOD_POINTS)
+
+    def set_labels(self, title, x_label, y_label, font):
+        self.axes.set_title(title, fontproperties=font)
+        self.axes.set_xlabel(x_label, fontproperties=font)
+        self.axes.set_ylabel(y_label, fontproperties=font)
+
+    def set_lines(self, x, lines, keep_view=False, bands=False):
+        """
+        显示折线. 图例与当前折线一致时只用 set_data 替换数据并保留各折线的显示状态,
+        否则重建折线和图例
+        :param x: x轴数据
+        :param lines: [LineData], 带置信区间时为 [ensemble.BandData]
+        :param keep_view: 是否保留用户缩放后的显示范围, 同一视图的数据更新(如跟踪文件)时使用
+        :param bands: 是否在折线下方绘制置信区间带
+        """
+        self.remove_bars()
+        x = np.asarray(x, dtype=np.float64)
+        max_points = self.max_points()
+        if not keep_view:
+            self.axes.autoscale(True)
+        if [line.label for line in lines] == [line.get_label() for line, _ in self.lod_lines]:
+            x0, x1 = self.axes.get_xlim() if not self.axes.get_autoscalex_on() else (-np.inf, np.inf)
+            for i, data in enumerate(lines):
+                line, _ = self.lod_lines[i]
+                pyramid = MinMaxPyramid(x, data.data)
+                line.set_data(*pyramid.query(x0, x1, max_points))
+                self.lod_lines[i] = (line, pyramid)
+                self.set_band(line, x, data if bands else None)
+        else:
+            self.remove_lines()
+            for data in lines:
+                pyramid = MinMaxPyramid(x, data.data)
+                line, = self.axes.plot(*pyramid.query(-np.inf, np.inf, max_points), label=data.label, animated=True)
+                self.lod_lines.append((line, pyramid))
+                self.set_band(line, x, data if bands else None)
+            self.update_legend()
+        self.axes.relim()
+        for band in self.bands.values():  # relim 不统计 PolyCollection
+            self.axes.update_datalim(band.get_paths()[0].vertices)
+        self.axes.autoscale_view()
+        self.draw_idle()
+
+    def set_bars(self, x, lines, names, bar_format, font):
+        """
+        显示柱状图, 柱子数量很少, 每次直接重建
+        :param bar_format: 柱子上方数值的格式
+        """
+        self.remove_lines()
+        self.remove_bars()
+        for line in lines:
+            self.bar_artists.extend(self.axes.bar(x, line.data, 0.35))
+            self.axes.set_xticks(x)
+            self.axes.set_xticklabels(names, rotation=45, fontproperties=font)
+            for i, v in enumerate(line.data):
+                self.bar_artists.append(self.axes.text(i, v, bar_format.format(v), ha='center', va='bottom',
+                                                       fontproperties=font))
+        self.axes.autoscale(True)
+        self.axes.relim()
+        self.axes.autoscale_view()
+        self.draw_idle()
+
+    def set_band(self, line, x, data):
+        """
+        更新折线对应的置信区间带, data为None时删除
+        """
+        band = self.bands.get(line)
+        if data is None:
+            if band is not None:
+                band.remove()
+                del self.bands[line]
+            return
+        # 区间带不随缩放重新抽稀, 按整体范围合并为不超过屏幕像素的点数
+        bx, lower, upper = envelope(x, data.lower, data.upper, self.max_points())
+        verts = np.concatenate([np.column_stack([bx, upper]), np.column_stack([bx[::-1], lower[::-1]])])
+        if band is None:
+            band = PolyCollection([verts], facecolor=line.get_color(), alpha=BAND_ALPHA, linewidth=0, animated=True)
+            self.axes.add_collection(band, autolim=False)
+            self.bands[line] = band
+        else:
+            band.set_verts([verts])
+        band.set_visible(line.get_visible())
+
+    def remove_lines(self):
+        for line, _ in self.lod_lines:
+            self.set_band(line, None, None)
+            line.remove()
+        self.lod_lines.clear()
+        self.update_legend()
+
+    def remove_bars(self):
+        if not self.bar_artists:
+            return
+        for artist in self.bar_artists:
+            artist.remove()
+        self.bar_artists.clear()
+        # 恢复柱状图替换掉的刻度
+        self.axes.xaxis.set_major_locator(AutoLocator())
+        self.axes.xaxis.set_major_formatter(ScalarFormatter())
+
+    def update_legend(self):
+        if self.legend is not None:
+            self.legend.remove()
+            self.legend = None
+        self.legend_lines.clear()
+        if not self.lod_lines:
+            return
+        # 添加图例，并使其浮动在右上角
+        self.legend = self.axes.legend(loc='center left', bbox_to_anchor=(1, 0.5))
+        self.legend.set_animated(True)
+        self.legend.set_draggable(True, use_blit=False)  # 允许拖动图例
+        # 点击图例中的线切换对应折线的可见性
+        for legend_line, (line, _) in zip(self.legend.get_lines(), self.lod_lines):
+            legend_line.set_picker(5)
+            legend_line.set_alpha(1 if line.get_visible() else 0.2)
+            self.legend_lines[legend_line] = line
+
+    # 性能分析时记录刷新后第一次完整重绘的耗时
+    def draw(self):
+        if self.profile is None:
+            super().draw()
+            return
+        (session, done), self.profile = self.profile, None
+        with profiler.activate(session), profiler.phase('渲染'):
+            super().draw()
+        done(session)
+
+    # 完整重绘后保存背景并画出动态元素
+    def on_draw(self, event):
+        self.background = self.copy_from_bbox(self.figure.bbox)
+        self.draw_lines()
+        if self.legend is not None:
+            self.figure.draw_artist(self.legend)
+        self.plot_image = self.copy_from_bbox(self.figure.bbox)
+        self.draw_cursor()
+
+    def draw_lines(self):
+        for line, _ in self.lod_lines:
+            if line.get_visible():
+                self.draw_series(line)
+
+    # 折线及其置信区间带
+    def draw_series(self, line, clip_box=None):
+        artists = [self.bands[line], line] if line in self.bands else [line]
+        for artist in artists:
+            if clip_box is None:
+                self.axes.draw_artist(artist)
+            else:
+                original = artist.get_clip_box()
+                artist.set_clip_box(clip_box)
+                self.axes.draw_artist(artist)
+                artist.set_clip_box(original)
+
+    def series_extent(self, line, renderer):
+        """
+        折线(含置信区间带和线宽)在屏幕上覆盖的区域
+        """
+        extent = line.get_window_extent(renderer)
+        if line in self.bands:
+            extent = Bbox.union([extent, self.bands[line].get_window_extent(renderer)])
+        return extent.padded(line.get_linewidth() + 2)
+
+    def draw_cursor(self):
+        if self.cursor.get_visible():
+            self.axes.draw_artist(self.cursor)
+            self.axes.draw_artist(self.cursor_text)
+
+    def restore_part(self, region, bbox):
+        """
+        只恢复保存画面中的一块区域
+        :param region: copy_from_bbox 保存的整幅画面
+        :param bbox: 显示坐标下的区域, 按整像素对齐
+        """
+        # 画面缓冲区的纵坐标从上往下, 恢复的像素与以同一区域为裁剪框绘制时覆盖的像素一致
+        height = int(self.figure.bbox.height)
+        x0, y0, x1, y1 = (int(v) for v in bbox.extents)
+        self.restore_region(region, bbox=(x0, height - y1, x1, height - y0 - 1), xy=(0, 0))
+
+    @staticmethod
+    def pixel_bbox(bbox):
+        # 向外取整到整像素
+        return Bbox.from_extents(np.floor(bbox.x0), np.floor(bbox.y0), np.ceil(bbox.x1), np.ceil(bbox.y1))
+
+    def redraw_area(self, area, renderer, restore=True):
+        """
+        在绘图区内的一块区域中恢复背景, 并以该区域为裁剪框重画与之相交的可见折线
+        """
+        if restore:
+            self.restore_part(self.background, area)
+        for other, _ in self.lod_lines:
+            if other.get_visible() and self.series_extent(other, renderer).overlaps(area):
+                self.draw_series(other, area)
+
+    # 切换折线的可见性, 只重绘变化的部分
+    def toggle_line(self, line, legend_line):
+        line.set_visible(not line.get_visible())
+        if line in self.bands:
+            self.bands[line].set_visible(line.get_visible())
+        legend_line.set_alpha(1 if line.get_visible() else 0.2)  # 透明度为 0.2 表示被隐藏
+        if self.plot_image is None:
+            self.draw_idle()
+            return
+
+        renderer = self.get_renderer()
+        area = Bbox.intersection(self.series_extent(line, renderer), self.axes.bbox)
+        if line.get_visible():
+            # 显示时直接画在现有画面上, 下次完整重绘前该折线位于最上层
+            self.restore_region(self.plot_image)
+            self.draw_series(line)
+        else:
+            # 隐藏时只在该折线覆盖的区域内恢复背景并重画与之相交的其余折线
+            self.restore_region(self.plot_image)
+            if area is not None:
+                self.redraw_area(self.pixel_bbox(area), renderer)
+        legend_extent = self.legend.get_window_extent(renderer).padded(2)
+        if area is not None and legend_extent.overlaps(area):
+            # 图例被拖入绘图区并与变化的区域重叠, 背景不含图例, 恢复图例下方的画面后重画整个图例
+            legend_area = self.pixel_bbox(legend_extent)
+            inside = Bbox.intersection(legend_area, self.axes.bbox)
+            self.restore_part(self.background, legend_area)
+            if inside is not None:
+                self.redraw_area(self.pixel_bbox(inside), renderer, restore=False)
+            self.figure.draw_artist(self.legend)
+        else:
+            # 图例只重画被点击的线条
+            extent = legend_line.get_window_extent(renderer).padded(2)
+            self.restore_part(self.background, self.pixel_bbox(extent))
+            self.figure.draw_artist(legend_line)
+        self.plot_image = self.copy_from_bbox(self.figure.bbox)
+        self.draw_cursor()
+        self.blit(self.figure.bbox)
+
+    # 定义点击事件处理函数
+    def on_pick(self, event):
+        # 获取点击的图例项
+        line = self.legend_lines.get(event.artist)
+        if line is not None:
+            self.toggle_line(line, event.artist)
+
+    # 鼠标移动时显示所在位置的坐标
+    def on_hover(self, event):
+        # 拖动(平移、缩放、拖动图例)时画面会完整重绘, 不做局部更新
+        if event.inaxes is not self.axes or event.xdata is None or event.button is not None:
+            return
+        self.cursor.set_xdata([event.xdata, event.xdata])
+        self.cursor_text.set_text(f"x={event.xdata:.4g}, y={event.ydata:.4g}")
+        self.cursor.set_visible(True)
+        self.cursor_text.set_visible(True)
+        self.update_cursor()
+
+    def on_leave(self, event):
+        self.cursor.set_visible(False)
+        self.cursor_text.set_visible(False)
+        self.update_cursor()
+
+    def update_cursor(self):
+        if self.plot_image is None:
+            return
+        self.restore_region(self.plot_image)
+        self.draw_cursor()
+        self.blit(self.figure.bbox)
+
+    # 缩放或平移后按新的显示范围重新抽稀
+    def on_xlim_changed(self, axes):
+        x0, x1 = axes.get_xlim()
+        max_points = self.max_points()
+        for line, pyramid in self.lod_lines:
+            line.set_data(*pyramid.query(x0, x1, max_points))
 
 
 class TabPage(QWidget):
@@ -40,19 +432,40 @@ class TabPage(QWidget):
         self.header_label = None  # 顶部标题
         self.x_label = None  # x轴标题
         self.y_label = None  # y轴标题
-
-        # 查找系统中的中文字体
-        font_list = font_manager.findSystemFonts(fontpaths=None, fontext='ttf')
-        chinese_fonts = [f for f in font_list if 'SimSun' in f or 'msyh.ttc' in f]
+        self.follow_check_box = None  # 跟踪文件复选框
+        self.sparse_check_box = None  # 稀疏存储复选框
+        self.range_start_line_edit = None  # 读取范围起点输入框, 等温热解为时间(ps), 升温热解为温度(K)
+        self.range_end_line_edit = None  # 读取范围终点输入框
+        self.stride_line_edit = None  # 帧间隔输入框
+        self.top_n_line_edit = None  # 显示物种数输入框
+        self.combo_box_rank = None  # 物种排序依据
+        self.combo_box_smooth = None  # 平滑方法
+        self.smooth_window_line_edit = None  # 平滑窗口输入框
+        self.rate_check_box = None  # 显示变化速率复选框
+        self.combo_box_wide = None  # 导出xlsx时列数超限的处理方式
+        self.plot_data = None  # 当前页的绘图方法
+        self.view_names = None  # 柱状图的横轴标签
+        self.drawn_view = None  # 当前图表对应的视图, 用于判断刷新时能否保留缩放范围
+        self.progress_bar = None  # 加载进度条
+        self.cancel_button = None  # 取消加载按钮
+        self.task = None  # 正在执行的后台任务
+        self.running = set()  # 已提交但尚未结束的后台任务, 防止被提前回收
+        self.follow_task = None  # 最近一次跟踪任务, 结束前不再开始新的跟踪
+        self.follow_timer = QTimer(self)  # 跟踪模式定时刷新
+        self.follow_timer.setInterval(FOLLOW_INTERVAL)
+        self.follow_timer.timeout.connect(self.follow_update)
+
+        # 查找系统中的中文字体, 每个进程只查找一次, 结果缓存在磁盘上
+        font_path = chinese_font_path()
 
         # 使用找到的第一个中文字体
-        if chinese_fonts:
-            self.font = font_manager.FontProperties(fname=chinese_fonts[0], size=10)
+        if font_path:
+            self.font = FontProperties(fname=font_path, size=10)
             # 设置全局字体
-            plt.rcParams['font.sans-serif'] = [self.font.get_name()]
+            matplotlib.rcParams['font.sans-serif'] = [self.font.get_name()]
         else:
             # 如果没有找到中文字体，则使用默认字体
-            self.font = font_manager.FontProperties(size=10)
+            self.font = FontProperties(size=10)
 
         if title == '等温热解':
             self.equal_heat_decompose()
@@ -106,6 +519,37 @@ class TabPage(QWidget):
         footstep_layout.addWidget(self.footstep_line_edit)
         left_layout.addLayout(footstep_layout)
 
+        # 添加跟踪文件复选框, 选中后定时读取文件新追加的帧
+        self.follow_check_box = QCheckBox("跟踪文件")
+        self.follow_check_box.toggled.connect(self.toggle_follow)
+        left_layout.addWidget(self.follow_check_box)
+
+        # 添加稀疏存储复选框, 物种很多且大多只短暂出现时可大幅减少内存
+        self.sparse_check_box = QCheckBox("稀疏存储")
+        left_layout.addWidget(self.sparse_check_box)
+
+        # 添加读取范围及帧间隔输入框, 只读取范围内每隔N帧的一帧, 留空读取全部; 跟踪文件时忽略
+        range_layout = QHBoxLayout()
+        range_label = QLabel("读取范围 (ps):")
+        self.range_start_line_edit = QLineEdit()
+        self.range_start_line_edit.setValidator(QDoubleValidator())  # 验证输入为数字
+        self.range_end_line_edit = QLineEdit()
+        self.range_end_line_edit.setValidator(QDoubleValidator())  # 验证输入为数字
+        range_layout.addWidget(range_label)
+        range_layout.addWidget(self.range_start_line_edit)
+        range_layout.addWidget(QLabel("-"))
+        range_layout.addWidget(self.range_end_line_edit)
+        left_layout.addLayout(range_layout)
+
+        stride_layout = QHBoxLayout()
+        stride_label = QLabel("帧间隔:")
+        self.stride_line_edit = QLineEdit()
+        self.stride_line_edit.setText("1")
+        self.stride_line_edit.setValidator(QIntValidator(1, 1000000))  # 验证输入为正整数
+        stride_layout.addWidget(stride_label)
+        stride_layout.addWidget(self.stride_line_edit)
+        left_layout.addLayout(stride_layout)
+
         self.combo_box_type = QComboBox()
         self.combo_box_type.addItem("有机物")
         self.combo_box_type.addItem("无机物")
@@ -123,15 +567,69 @@ class TabPage(QWidget):
         # self.combo_box_count.currentIndexChanged.connect(self.update_plot_equal_heat)
         left_layout.addWidget(self.combo_box_count)
 
+        # 添加显示物种数输入框, 只显示排名前N的物种, 其余合并为"其他", 留空显示全部
+        top_n_layout = QHBoxLayout()
+        top_n_label = QLabel("显示前N种:")
+        self.top_n_line_edit = QLineEdit()
+        self.top_n_line_edit.setValidator(QIntValidator(1, 1000000))  # 验证输入为正整数
+        self.combo_box_rank = QComboBox()
+        for name in RANK_BY:
+            self.combo_box_rank.addItem(name)
+        top_n_layout.addWidget(top_n_label)
+        top_n_layout.addWidget(self.top_n_line_edit)
+        top_n_layout.addWidget(self.combo_box_rank)
+        left_layout.addLayout(top_n_layout)
+
+        # 添加平滑方法、窗口及变化速率选项, 只对折线图有效
+        smooth_layout = QHBoxLayout()
+        smooth_label = QLabel("平滑:")
+        self.combo_box_smooth = QComboBox()
+        self.combo_box_smooth.addItem(NO_SMOOTH)
+        for name in SMOOTH_METHODS.values():
+            self.combo_box_smooth.addItem(name)
+        self.smooth_window_line_edit = QLineEdit()
+        self.smooth_window_line_edit.setText(str(SMOOTH_WINDOW))
+        self.smooth_window_line_edit.setValidator(QIntValidator(1, 1000000))  # 验证输入为正整数
+        self.rate_check_box = QCheckBox("变化速率")
+        smooth_layout.addWidget(smooth_label)
+        smooth_layout.addWidget(self.combo_box_smooth)
+        smooth_layout.addWidget(self.smooth_window_line_edit)
+        smooth_layout.addWidget(self.rate_check_box)
+        left_layout.addLayout(smooth_layout)
+
         # 添加刷新按钮
         refresh_button = QPushButton('刷新')
         refresh_button.clicked.connect(self.update_plot_equal_heat)
+        self.plot_data = self.plot_equal_heat
         left_layout.addWidget(refresh_button)
 
         # 添加导出按钮
-        export_button = QPushButton('导出Excel')
+        export_button = QPushButton('导出数据')
         export_button.clicked.connect(self.export_data)
         left_layout.addWidget(export_button)
+        export_all_button = QPushButton('导出全部视图')
+        export_all_button.clicked.connect(self.export_all_views)
+        left_layout.addWidget(export_all_button)
+        # 导出xlsx时列数超过上限的处理方式
+        wide_layout = QHBoxLayout()
+        wide_label = QLabel("超宽表:")
+        self.combo_box_wide = QComboBox()
+        for name in WIDE_MODES:
+            self.combo_box_wide.addItem(name)
+        wide_layout.addWidget(wide_label)
+        wide_layout.addWidget(self.combo_box_wide)
+        left_layout.addLayout(wide_layout)
+
+        # 添加加载进度条和取消按钮, 只在后台加载时显示
+        progress_layout = QHBoxLayout()
+        self.progress_bar = QProgressBar()
+        self.progress_bar.hide()
+        self.cancel_button = QPushButton('取消')
+        self.cancel_button.clicked.connect(self.cancel_task)
+        self.cancel_button.hide()
+        progress_layout.addWidget(self.progress_bar)
+        progress_layout.addWidget(self.cancel_button)
+        left_layout.addLayout(progress_layout)
 
         left_widget = QWidget()
         left_widget.setLayout(left_layout)
@@ -197,6 +695,37 @@ class TabPage(QWidget):
         footstep_layout.addWidget(self.footstep_line_edit)
         left_layout.addLayout(footstep_layout)
 
+        # 添加跟踪文件复选框, 选中后定时读取文件新追加的帧
+        self.follow_check_box = QCheckBox("跟踪文件")
+        self.follow_check_box.toggled.connect(self.toggle_follow)
+        left_layout.addWidget(self.follow_check_box)
+
+        # 添加稀疏存储复选框, 物种很多且大多只短暂出现时可大幅减少内存
+        self.sparse_check_box = QCheckBox("稀疏存储")
+        left_layout.addWidget(self.sparse_check_box)
+
+        # 添加读取范围及帧间隔输入框, 只读取范围内每隔N帧的一帧, 留空读取全部; 跟踪文件时忽略
+        range_layout = QHBoxLayout()
+        range_label = QLabel("读取范围 (K):")
+        self.range_start_line_edit = QLineEdit()
+        self.range_start_line_edit.setValidator(QDoubleValidator())  # 验证输入为数字
+        self.range_end_line_edit = QLineEdit()
+        self.range_end_line_edit.setValidator(QDoubleValidator())  # 验证输入为数字
+        range_layout.addWidget(range_label)
+        range_layout.addWidget(self.range_start_line_edit)
+        range_layout.addWidget(QLabel("-"))
+        range_layout.addWidget(self.range_end_line_edit)
+        left_layout.addLayout(range_layout)
+
+        stride_layout = QHBoxLayout()
+        stride_label = QLabel("帧间隔:")
+        self.stride_line_edit = QLineEdit()
+        self.stride_line_edit.setText("1")
+        self.stride_line_edit.setValidator(QIntValidator(1, 1000000))  # 验证输入为正整数
+        stride_layout.addWidget(stride_label)
+        stride_layout.addWidget(self.stride_line_edit)
+        left_layout.addLayout(stride_layout)
+
         # 添加初始温度输入框
         initial_temp_layout = QHBoxLayout()
         initial_temp_label = QLabel("初始温度 (K):")
@@ -230,15 +759,69 @@ class TabPage(QWidget):
         self.combo_box_count.addItem("质量百分比")
         left_layout.addWidget(self.combo_box_count)
 
+        # 添加显示物种数输入框, 只显示排名前N的物种, 其余合并为"其他", 留空显示全部
+        top_n_layout = QHBoxLayout()
+        top_n_label = QLabel("显示前N种:")
+        self.top_n_line_edit = QLineEdit()
+        self.top_n_line_edit.setValidator(QIntValidator(1, 1000000))  # 验证输入为正整数
+        self.combo_box_rank = QComboBox()
+        for name in RANK_BY:
+            self.combo_box_rank.addItem(name)
+        top_n_layout.addWidget(top_n_label)
+        top_n_layout.addWidget(self.top_n_line_edit)
+        top_n_layout.addWidget(self.combo_box_rank)
+        left_layout.addLayout(top_n_layout)
+
+        # 添加平滑方法、窗口及变化速率选项, 只对折线图有效
+        smooth_layout = QHBoxLayout()
+        smooth_label = QLabel("平滑:")
+        self.combo_box_smooth = QComboBox()
+        self.combo_box_smooth.addItem(NO_SMOOTH)
+        for name in SMOOTH_METHODS.values():
+            self.combo_box_smooth.addItem(name)
+        self.smooth_window_line_edit = QLineEdit()
+        self.smooth_window_line_edit.setText(str(SMOOTH_WINDOW))
+        self.smooth_window_line_edit.setValidator(QIntValidator(1, 1000000))  # 验证输入为正整数
+        self.rate_check_box = QCheckBox("变化速率")
+        smooth_layout.addWidget(smooth_label)
+        smooth_layout.addWidget(self.combo_box_smooth)
+        smooth_layout.addWidget(self.smooth_window_line_edit)
+        smooth_layout.addWidget(self.rate_check_box)
+        left_layout.addLayout(smooth_layout)
+
         # 添加刷新按钮
         refresh_button = QPushButton('刷新')
         refresh_button.clicked.connect(self.update_plot_heating)
+        self.plot_data = self.plot_heating
         left_layout.addWidget(refresh_button)
 
         # 添加导出按钮
-        export_button = QPushButton('导出Excel')
+        export_button = QPushButton('导出数据')
         export_button.clicked.connect(self.export_data)
         left_layout.addWidget(export_button)
+        export_all_button = QPushButton('导出全部视图')
+        export_all_button.clicked.connect(self.export_all_views)
+        left_layout.addWidget(export_all_button)
+        # 导出xlsx时列数超过上限的处理方式
+        wide_layout = QHBoxLayout()
+        wide_label = QLabel("超宽表:")
+        self.combo_box_wide = QComboBox()
+        for name in WIDE_MODES:
+            self.combo_box_wide.addItem(name)
+        wide_layout.addWidget(wide_label)
+        wide_layout.addWidget(self.combo_box_wide)
+        left_layout.addLayout(wide_layout)
+
+        # 添加加载进度条和取消按钮, 只在后台加载时显示
+        progress_layout = QHBoxLayout()
+        self.progress_bar = QProgressBar()
+        self.progress_bar.hide()
+        self.cancel_button = QPushButton('取消')
+        self.cancel_button.clicked.connect(self.cancel_task)
+        self.cancel_button.hide()
+        progress_layout.addWidget(self.progress_bar)
+        progress_layout.addWidget(self.cancel_button)
+        left_layout.addLayout(progress_layout)
 
         left_widget = QWidget()
         left_widget.setLayout(left_layout)
@@ -257,22 +840,26 @@ class TabPage(QWidget):
         layout.addWidget(splitter)
         self.setLayout(layout)
 
-    # 选择文件
+    # 选择文件, 同时选择多个文件时作为重复模拟统计
     def open_filename_dialog(self):
-        file_name, _ = QFileDialog.getOpenFileName(self, "选择文件", "", "所有文件 (*);;文本文件 (*.txt)")
-        if file_name:
-            self.file_line_edit.setText(file_name)
+        file_names, _ = QFileDialog.getOpenFileNames(self, "选择文件", "", "所有文件 (*);;文本文件 (*.txt)")
+        if file_names:
+            self.file_line_edit.setText(FILE_SEPARATOR.join(file_names))
             # self.update_plot_equal_heat()  # 文件选择后立即更新图表
 
         # 选择文件
     def open_filename_dialog_heating(self):
-        file_name, _ = QFileDialog.getOpenFileName(self, "选择文件", "", "所有文件 (*);;文本文件 (*.txt)")
-        if file_name:
-            self.file_line_edit.setText(file_name)
+        file_names, _ = QFileDialog.getOpenFileNames(self, "选择文件", "", "所有文件 (*);;文本文件 (*.txt)")
+        if file_names:
+            self.file_line_edit.setText(FILE_SEPARATOR.join(file_names))
             # self.update_plot_heating()  # 文件选择后立即更新图表
 
-    # 更新数据
-    def refresh_data(self):
+    # 更新数据, 在后台线程中加载文件并计算当前视图
+    def refresh_data(self, heating=False):
+        from ensemble import ENSEMBLE_VIEWS, Ensemble, load_replicas
+        from data import TableData
+        from store import data_store
+
         # 获取当前选择的文件路径
         self.file_path = self.file_line_edit.text()
         # 获取当前选择的含量类型
@@ -284,238 +871,284 @@ class TabPage(QWidget):
 
         print("文件路径:", self.file_path, "含量类型:", self.count_type, "有机物类型:", self.organic_type)
 
-        self.sc.axes.clear()  # 清除旧的图表
+        # 控件只能在主线程读取, 先取出后台计算需要的全部参数
+        params = self.view_params(heating)
+        follow = self.follow_check_box.isChecked()
+        sparse = self.sparse_check_box.isChecked()
+        file_path, footstep = self.file_path, self.footstep
+        try:
+            time_range, stride = self.load_range(heating)
+        except ValueError as e:
+            QMessageBox.warning(self, "读取范围无效", str(e))
+            return
+        paths = [path for path in file_path.split(FILE_SEPARATOR) if path]
+        if len(paths) > 1 and (self.count_type, self.organic_type) not in ENSEMBLE_VIEWS:
+            QMessageBox.warning(self, "无法统计重复模拟", "重复模拟只支持 含量、数量 的 有机物、无机物、有机物分类、总分子个数")
+            return
 
-        self.data = TableData(self.file_path, self.footstep)
+        def load(task):
+            if len(paths) > 1:  # 重复模拟, 不支持跟踪文件
+                data = Ensemble(load_replicas(paths, footstep, sparse=sparse, progress=task.report,
+                                              time_range=time_range, stride=stride))
+            elif follow:
+                data = TableData(file_path, footstep, follow=True, progress=task.report)
+            else:
+                data = data_store.get(file_path, footstep, sparse=sparse, progress=task.report, time_range=time_range,
+                                      stride=stride)
+            return compute_view(task, data, params)
+
+        self.start_task(load)
+
+    def load_range(self, heating=False):
+        """
+        读取范围及帧间隔
+        :param heating: 范围是否为温度, 是则按初始温度和升温速率换算为时间
+        :return: (时间范围(ps), 帧间隔), 范围两端都留空时时间范围为None
+        """
+        from data import temperature_to_time
+
+        start, end = (float(edit.text()) if edit.text() else None
+                      for edit in (self.range_start_line_edit, self.range_end_line_edit))
+        stride = int(self.stride_line_edit.text() or 1)
+        if start is None and end is None:
+            return None, stride
+        if start is not None and end is not None and start > end:
+            raise ValueError("范围起点不能大于终点")
+        if heating:
+            return temperature_to_time((start, end), self.initial_temp_line_edit.text(),
+                                       self.heating_rate_line_edit.text()), stride
+        return (start, end), stride
+
+    # 只显示前N种物种时的参数
+    def top_n_args(self):
+        text = self.top_n_line_edit.text()
+        return {'top_n': int(text) if text else None, 'rank_by': RANK_BY[self.combo_box_rank.currentText()]}
+
+    # 平滑及变化速率参数
+    def smooth_args(self):
+        methods = {name: method for method, name in SMOOTH_METHODS.items()}
+        return {'smooth': methods.get(self.combo_box_smooth.currentText()),
+                'window': int(self.smooth_window_line_edit.text() or SMOOTH_WINDOW),
+                'rate': self.rate_check_box.isChecked()}
+
+    # 导出xlsx时列数超过上限的处理方式, 见 export.split_table
+    def wide_mode(self):
+        return WIDE_MODES[self.combo_box_wide.currentText()]
+
+    def view_params(self, heating=False):
+        """
+        计算视图所需的参数
+        :param heating: 是否以温度为x轴
+        :return: 参数字典
+        """
+        params = {'view': (self.count_type, self.organic_type), 'temperature': None,
+                  'view_args': {**self.top_n_args(), **self.smooth_args()}}
+        if heating:
+            params['temperature'] = (self.initial_temp_line_edit.text(), self.heating_rate_line_edit.text())
+        return params
+
+    def start_task(self, fn, on_done=None, progress_format="%p% 已解析 {} 帧", error_title=None, name=None):
+        """
+        在线程池中执行 fn(task), 新任务会取消并取代尚未完成的旧任务
+        :param fn: 后台执行的函数
+        :param on_done: 完成后在主线程中以结果调用, 默认为显示计算的视图
+        :param progress_format: 进度条文字, {} 处填入已解析帧数或已写入行数
+        :param error_title: 失败时提示框的标题, 默认按视图类型区分
+        :param name: 性能分析中的名称, 默认为当前视图
+        """
+        if self.task is not None:
+            self.task.cancel()
+        task = Task(fn)
+        task.session = profiler.session(name or f'{self.count_type}/{self.organic_type}')
+        task.on_done = on_done or self.show_view
+        task.progress_format = progress_format
+        task.error_title = error_title
+        task.signals.progress.connect(lambda done, total, frames: self.on_task_progress(task, done, total, frames))
+        task.signals.finished.connect(lambda result: self.on_task_finished(task, result))
+        task.signals.failed.connect(lambda error: self.on_task_failed(task, error))
+        self.task = task
+        self.running.add(task)
+        self.progress_bar.setRange(0, 0)  # 读取缓存时没有进度, 先显示为忙碌
+        self.progress_bar.setFormat("处理中...")
+        self.progress_bar.show()
+        self.cancel_button.show()
+        QThreadPool.globalInstance().start(task)
+
+    def cancel_task(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        self.end_task()
+
+    def end_task(self):
+        self.progress_bar.hide()
+        self.cancel_button.hide()
+
+    def on_task_progress(self, task, done, total, frames):
+        if task is not self.task:
+            return
+        self.progress_bar.setRange(0, PROGRESS_STEPS)
+        self.progress_bar.setValue(int(done * PROGRESS_STEPS // max(total, 1)))
+        self.progress_bar.setFormat(task.progress_format.format(frames))
 
-    # 更新图表
-    def update_plot_equal_heat(self):
-        self.refresh_data()
+    def on_task_finished(self, task, result):
+        self.running.discard(task)
+        if task is not self.task:  # 已被新的刷新取代
+            return
+        self.task = None
+        self.end_task()
+        if result is None:
+            return
+        with profiler.activate(task.session):
+            task.on_done(result)
+        # 显示视图时在绘图区重绘后再显示耗时, 见 draw_view
+        if task.session is not None and (self.sc.profile is None or self.sc.profile[0] is not task.session):
+            self.show_profile(task.session)
+
+    # 在状态栏显示各阶段耗时, 设置了trace文件时同时写入
+    def show_profile(self, session):
+        text = profiler.finish(session)
+        window = self.window()
+        if isinstance(window, QMainWindow):
+            window.statusBar().showMessage(text)
+
+    def show_view(self, result):
+        self.data, self.view_names, self.export_df = result
+        self.plot_data()
+
+    def on_task_failed(self, task, error):
+        self.running.discard(task)
+        if task is not self.task:
+            return
+        self.task = None
+        self.end_task()
+        if task.error_title is not None:
+            QMessageBox.warning(self, task.error_title, str(error))
+        elif isinstance(error, ValueError) and FILE_SEPARATOR in self.file_path:
+            QMessageBox.warning(self, "无法统计重复模拟", str(error))
+        elif isinstance(error, ValueError) and self.count_type == '质量百分比':
+            QMessageBox.warning(self, "无法计算质量", str(error))
+        else:
+            QMessageBox.warning(self, "加载失败", str(error))
 
-        self.sc.axes.clear()  # 清除旧的图表
-        self.sc.axes.set_xlabel(self.x_label.text(), fontproperties=self.font)
-        self.sc.axes.set_ylabel(self.y_label.text(), fontproperties=self.font)
-        self.sc.axes.set_title(self.header_label.text(), fontproperties=self.font)
-
-        if self.count_type == '含量':
-            if self.organic_type == '有机物':
-                self.export_df = self.data.organic_content()
-                for line in self.data.y:
-                    self.sc.axes.plot(self.data.x, line.data, label=line.label)  # 绘制新的图表
-
-            elif self.organic_type == '无机物':
-                self.export_df = self.data.inorganic_content()
-                for line in self.data.y:
-                    self.sc.axes.plot(self.data.x, line.data, label=line.label)  # 绘制新的图表
-
-            elif self.organic_type == '有机物分类':
-                self.export_df = self.data.organic_classification_content()
-                for line in self.data.y:
-                    self.sc.axes.plot(self.data.x, line.data, label=line.label)  # 绘制新的图表
-
-            elif self.organic_type == '最终有机产物':
-                names, self.export_df = self.data.organic_products()
-                for line in self.data.y:
-                    self.sc.axes.bar(self.data.x, line.data, 0.35)  # 绘制新的图表
-                    self.sc.axes.set_xticks(self.data.x)
-                    self.sc.axes.set_xticklabels(names, rotation=45, fontproperties=self.font)
-                    for i, v in enumerate(line.data):
-                        self.sc.axes.text(i, v, f"{v:.1f}%", ha='center', va='bottom', fontproperties=self.font)
-
-            elif self.organic_type == '最终有机产物分类':
-                names, self.export_df = self.data.organic_classification_products()
-                for line in self.data.y:
-                    self.sc.axes.bar(self.data.x, line.data, 0.35)  # 绘制新的图表
-                    self.sc.axes.set_xticks(self.data.x)
-                    self.sc.axes.set_xticklabels(names, rotation=45, fontproperties=self.font)
-                    for i, v in enumerate(line.data):
-                        self.sc.axes.text(i, v, f"{v:.1f}%", ha='center', va='bottom', fontproperties=self.font)
-
-            elif self.organic_type == '总分子个数':
-                self.export_df = self.data.moles_num()
-                for line in self.data.y:
-                    self.sc.axes.plot(self.data.x, line.data, label=line.label)  # 绘制新的图表
-
-        elif self.count_type == '数量':
-            if self.organic_type == '有机物':
-                self.export_df = self.data.organic_amount()
-                for line in self.data.y:
-                    self.sc.axes.plot(self.data.x, line.data, label=line.label)  # 绘制新的图表
-
-            elif self.organic_type == '无机物':
-                self.export_df = self.data.inorganic_amount()
-                for line in self.data.y:
-                    self.sc.axes.plot(self.data.x, line.data, label=line.label)  # 绘制新的图表
-
-            elif self.organic_type == '有机物分类':
-                self.export_df = self.data.organic_classification_amount()
-                for line in self.data.y:
-                    self.sc.axes.plot(self.data.x, line.data, label=line.label)  # 绘制新的图表
-
-            elif self.organic_type == '最终有机产物':
-                names, self.export_df = self.data.organic_products_amount()
-                for line in self.data.y:
-                    self.sc.axes.bar(self.data.x, line.data, 0.35)  # 绘制新的图表
-                    self.sc.axes.set_xticks(self.data.x)
-                    self.sc.axes.set_xticklabels(names, rotation=45, fontproperties=self.font)
-                    for i, v in enumerate(line.data):
-                        self.sc.axes.text(i, v, f"{v:.1f}", ha='center', va='bottom', fontproperties=self.font)
-
-            elif self.organic_type == '最终有机产物分类':
-                names, self.export_df = self.data.organic_classification_products_amount()
-                for line in self.data.y:
-                    self.sc.axes.bar(self.data.x, line.data, 0.35)  # 绘制新的图表
-                    self.sc.axes.set_xticks(self.data.x)
-                    self.sc.axes.set_xticklabels(names, rotation=45, fontproperties=self.font)
-                    for i, v in enumerate(line.data):
-                        self.sc.axes.text(i, v, f"{v:.1f}", ha='center', va='bottom', fontproperties=self.font)
-
-            elif self.organic_type == '总分子个数':
-                self.export_df = self.data.moles_num()
-                for line in self.data.y:
-                    self.sc.axes.plot(self.data.x, line.data, label=line.label)  # 绘制新的图表
-
-        elif self.count_type == '质量百分比':
-            if self.organic_type == '最终有机产物分类':
-                names, self.export_df = self.data.organic_classification_products_mass_percentage()
-                for line in self.data.y:
-                    self.sc.axes.bar(self.data.x, line.data, 0.35)  # 绘制新的图表
-                    self.sc.axes.set_xticks(self.data.x)
-                    self.sc.axes.set_xticklabels(names, rotation=45, fontproperties=self.font)
-                    for i, v in enumerate(line.data):
-                        self.sc.axes.text(i, v, f"{v:.1f}", ha='center', va='bottom', fontproperties=self.font)
+    def toggle_follow(self, checked):
+        if checked:
+            self.follow_timer.start()
+        else:
+            self.follow_timer.stop()
 
-        # 添加图例，并使其浮动在右上角
-        legend = self.sc.axes.legend(loc='center left', bbox_to_anchor=(1, 0.5))
-        # 为图例添加点击事件监听器
-        legend.set_draggable(True)  # 允许拖动图例
-        legend.figure.canvas.mpl_connect('pick_event', self.on_pick)  # 连接点击事件
+    # 跟踪模式下在后台读取新追加的帧并重绘
+    def follow_update(self):
+        if getattr(self.data, 'follower', None) is None or self.task is not None:  # 重复模拟不支持跟踪
+            return
+        if self.follow_task in self.running:  # 已取消的跟踪任务可能仍在读取, 同一时间只跟踪一次
+            return
+        # 在带独立跟踪状态的拷贝上读取新帧, 完成后在主线程中替换 self.data, 其他任务使用的数据不会被修改
+        data = self.data.clone(follow=True)
+        params = self.view_params(self.plot_data == self.plot_heating)
+
+        def poll(task):
+            if not data.follow():
+                return None
+            return compute_view(task, data, params)
 
-        self.sc.draw()  # 更新图表
+        self.start_task(poll, name='跟踪')
+        self.follow_task = self.task
+        self.end_task()  # 定时刷新不显示进度条
 
     # 更新图表
-    def update_plot_heating(self):
+    def update_plot_equal_heat(self):
         self.refresh_data()
 
+    def plot_equal_heat(self):
+        self.draw_view()
+
+    # 更新图表
+    def update_plot_heating(self):
         if not (bool(self.initial_temp_line_edit.text()) and bool(self.heating_rate_line_edit.text())):
             return
+        self.refresh_data(heating=True)
 
+    def plot_heating(self):
         print("文件路径:", self.file_path, "含量类型:", self.count_type, "有机物类型:", self.organic_type, "初始温度:", self.initial_temp_line_edit.text(), "加热速率:", self.heating_rate_line_edit.text())
+        self.draw_view()
+
+    # 按后台计算的结果绘图, 只在主线程调用
+    def draw_view(self):
+        from data import VIEWS
+        from ensemble import Ensemble
+
+        self.sc.set_labels(self.header_label.text(), self.x_label.text(), self.y_label.text(), self.font)
+        # 同一视图只是数据更新时保留缩放范围
+        heating = self.plot_data == self.plot_heating
+        drawn_view = (self.count_type, self.organic_type, self.file_path, self.footstep,
+                      self.view_params(heating)['temperature'], self.range_start_line_edit.text(),
+                      self.range_end_line_edit.text(), self.stride_line_edit.text(), tuple(self.smooth_args().items()))
+        keep_view, self.drawn_view = drawn_view == self.drawn_view, drawn_view
+        view = VIEWS.get((self.count_type, self.organic_type))
+        with profiler.phase('绘图'):
+            if isinstance(self.data, Ensemble):
+                self.sc.set_lines(self.data.x, self.data.y, keep_view, bands=True)
+            elif view is None:
+                self.sc.set_lines([], [])
+            elif view[2] is not None:  # 柱状图
+                self.sc.set_bars(self.data.x, self.data.y, self.view_names, view[2], self.font)
+            else:
+                self.sc.set_lines(self.data.x, self.data.y, keep_view)
+        session = profiler.current()
+        if session is not None:  # 实际渲染在下一次重绘时进行, 渲染后再显示耗时
+            self.sc.profile = (session, self.show_profile)
+
+    # 导出当前视图, 在后台线程中写入
+    def export_data(self):
+        from export import EXPORT_FILTER, write_tables
 
-        self.sc.axes.clear()  # 清除旧的图表
-        self.sc.axes.set_xlabel(self.x_label.text(), fontproperties=self.font)
-        self.sc.axes.set_ylabel(self.y_label.text(), fontproperties=self.font)
-        self.sc.axes.set_title(self.header_label.text(), fontproperties=self.font)
-
-        self.data.set_x_temp(self.initial_temp_line_edit.text(), self.heating_rate_line_edit.text())
-
-        if self.count_type == '含量':
-            if self.organic_type == '有机物':
-                self.export_df = self.data.organic_content()
-                for line in self.data.y:
-                    self.sc.axes.plot(self.data.x, line.data, label=line.label)  # 绘制新的图表
-
-            elif self.organic_type == '无机物':
-                self.export_df = self.data.inorganic_content()
-                for line in self.data.y:
-                    self.sc.axes.plot(self.data.x, line.data, label=line.label)  # 绘制新的图表
-
-            elif self.organic_type == '有机物分类':
-                self.export_df = self.data.organic_classification_content()
-                for line in self.data.y:
-                    self.sc.axes.plot(self.data.x, line.data, label=line.label)  # 绘制新的图表
-
-            elif self.organic_type == '最终有机产物':
-                names, self.export_df = self.data.organic_products()
-                for line in self.data.y:
-                    self.sc.axes.bar(self.data.x, line.data, 0.35)  # 绘制新的图表
-                    self.sc.axes.set_xticks(self.data.x)
-                    self.sc.axes.set_xticklabels(names, rotation=45, fontproperties=self.font)
-                    for i, v in enumerate(line.data):
-                        self.sc.axes.text(i, v, f"{v:.1f}%", ha='center', va='bottom', fontproperties=self.font)
-
-            elif self.organic_type == '最终有机产物分类':
-                names, self.export_df = self.data.organic_classification_products()
-                for line in self.data.y:
-                    self.sc.axes.bar(self.data.x, line.data, 0.35)  # 绘制新的图表
-                    self.sc.axes.set_xticks(self.data.x)
-                    self.sc.axes.set_xticklabels(names, rotation=45, fontproperties=self.font)
-                    for i, v in enumerate(line.data):
-                        self.sc.axes.text(i, v, f"{v:.1f}%", ha='center', va='bottom', fontproperties=self.font)
-
-            elif self.organic_type == '总分子个数':
-                self.export_df = self.data.moles_num()
-                for line in self.data.y:
-                    self.sc.axes.plot(self.data.x, line.data, label=line.label)  # 绘制新的图表
-
-        elif self.count_type == '数量':
-            if self.organic_type == '有机物':
-                self.export_df = self.data.organic_amount()
-                for line in self.data.y:
-                    self.sc.axes.plot(self.data.x, line.data, label=line.label)  # 绘制新的图表
-
-            elif self.organic_type == '无机物':
-                self.export_df = self.data.inorganic_amount()
-                for line in self.data.y:
-                    self.sc.axes.plot(self.data.x, line.data, label=line.label)  # 绘制新的图表
-
-            elif self.organic_type == '有机物分类':
-                self.export_df = self.data.organic_classification_amount()
-                for line in self.data.y:
-                    self.sc.axes.plot(self.data.x, line.data, label=line.label)  # 绘制新的图表
-
-            elif self.organic_type == '最终有机产物':
-                names, self.export_df = self.data.organic_products_amount()
-                for line in self.data.y:
-                    self.sc.axes.bar(self.data.x, line.data, 0.35)  # 绘制新的图表
-                    self.sc.axes.set_xticks(self.data.x)
-                    self.sc.axes.set_xticklabels(names, rotation=45, fontproperties=self.font)
-                    for i, v in enumerate(line.data):
-                        self.sc.axes.text(i, v, f"{v:.1f}", ha='center', va='bottom', fontproperties=self.font)
-
-            elif self.organic_type == '最终有机产物分类':
-                names, self.export_df = self.data.organic_classification_products_amount()
-                for line in self.data.y:
-                    self.sc.axes.bar(self.data.x, line.data, 0.35)  # 绘制新的图表
-                    self.sc.axes.set_xticks(self.data.x)
-                    self.sc.axes.set_xticklabels(names, rotation=45, fontproperties=self.font)
-                    for i, v in enumerate(line.data):
-                        self.sc.axes.text(i, v, f"{v:.1f}", ha='center', va='bottom', fontproperties=self.font)
-
-            elif self.organic_type == '总分子个数':
-                self.export_df = self.data.moles_num()
-                for line in self.data.y:
-                    self.sc.axes.plot(self.data.x, line.data, label=line.label)  # 绘制新的图表
-
-        # 添加图例，并使其浮动在右上角
-        legend = self.sc.axes.legend(loc='center left', bbox_to_anchor=(1, 0.5))
-        # 为图例添加点击事件监听器
-        legend.set_draggable(True)  # 允许拖动图例
-        legend.figure.canvas.mpl_connect('pick_event', self.on_pick)  # 连接点击事件
+        if self.export_df is None:
+            QMessageBox.warning(self, "无法导出", "请先刷新图表")
+            return
+        # 打开对话框让用户选择目录并输入文件名, 按扩展名决定导出格式
+        file_name, _ = QFileDialog.getSaveFileName(self, "导出数据", "", EXPORT_FILTER)
+        if file_name:
+            export_df, wide = self.export_df, self.wide_mode()
+            self.start_task(lambda task: write_tables(file_name, {'Sheet1': export_df}, wide, task.report),
+                            self.export_finished, "%p% 已写入 {} 行", "导出失败", "导出")
 
-        self.sc.draw()  # 更新图表
+    # 一次计算并导出全部视图, xlsx 每个视图一个工作表
+    def export_all_views(self):
+        from export import EXPORT_FILTER, view_tables, write_tables
 
-    # 添加导出方法用于等温热解
-    def export_data(self):
-        # 打开对话框让用户选择目录并输入文件名
-        file_name, _ = QFileDialog.getSaveFileName(self, "保存Excel文件", "", "Excel Files (*.xlsx)")
+        if self.data is None:
+            QMessageBox.warning(self, "无法导出", "请先刷新图表")
+            return
+        file_name, _ = QFileDialog.getSaveFileName(self, "导出全部视图", "", EXPORT_FILTER)
         if file_name:
-            # 将数据写入 Excel 文件
-            with pd.ExcelWriter(file_name, engine='xlsxwriter') as writer:
-                # 写入数据到 Excel 文件
-                # 示例: df.to_excel(writer, sheet_name='Sheet1')
-                self.export_df.to_excel(writer, sheet_name='Sheet1', index=False)
-
-            # 弹出对话框提示导出成功
-            msg_box = QMessageBox(self)
-            msg_box.setWindowTitle("导出成功")
-            msg_box.setText("文件已成功导出！")
-            msg_box.setStandardButtons(QMessageBox.Ok | QMessageBox.Open)
-            msg_box.setDefaultButton(QMessageBox.Ok)
-
-            # 连接按钮点击事件
-            msg_box.button(QMessageBox.Open).clicked.connect(lambda: self.open_file(file_name))
-            msg_box.exec_()
+            data, view_args, wide = self.data, {**self.top_n_args(), **self.smooth_args()}, self.wide_mode()
+            temperature = self.view_params(self.plot_data == self.plot_heating)['temperature']
+
+            def export(task):
+                tables, errors = view_tables(data, temperature=temperature, **view_args)
+                task.check()
+                return write_tables(file_name, tables, wide, task.report), errors
+
+            self.start_task(export, lambda result: self.export_finished(*result), "%p% 已写入 {} 行", "导出失败",
+                            "导出全部视图")
+
+    def export_finished(self, written, errors=None):
+        # 弹出对话框提示导出成功, 列出无法计算的视图
+        msg_box = QMessageBox(self)
+        msg_box.setWindowTitle("导出成功")
+        text = "文件已成功导出！"
+        if len(written) > 1:
+            text += "\n" + "\n".join(written)
+        if errors:
+            text += "\n以下视图无法计算, 未导出:\n" + "\n".join(f"{name}: {error}" for name, error in errors.items())
+        msg_box.setText(text)
+        msg_box.setStandardButtons(QMessageBox.Ok | QMessageBox.Open)
+        msg_box.setDefaultButton(QMessageBox.Ok)
+
+        # 连接按钮点击事件
+        msg_box.button(QMessageBox.Open).clicked.connect(lambda: self.open_file(written[0]))
+        msg_box.exec_()
 
     def open_file(self, file_name):
         # 打开文件
@@ -525,24 +1158,6 @@ class TabPage(QWidget):
             opener = "open" if sys.platform == "darwin" else "xdg-open"
             subprocess.call([opener, file_name])
 
-    # 定义点击事件处理函数
-    def on_pick(self, event):
-        # 获取点击的图例项
-        legline = event.artist
-        origline = legline.get_children()[0]  # 获取原始的线条对象
-        legline.set_alpha(1)  # 设置图例线条的透明度为 1，确保始终可见
-
-        # 切换原始线条的可见性
-        if origline.get_visible():
-            origline.set_visible(False)
-            legline.set_alpha(0.2)  # 设置图例线条的透明度为 0.2，表示被隐藏
-        else:
-            origline.set_visible(True)
-            legline.set_alpha(1)  # 设置图例线条的透明度为 1，表示可见
-
-        # 更新图表
-        legline.figure.canvas.draw()
-
 
 class MyApp(QMainWindow):
     def __init__(self):
@@ -569,6 +1184,7 @@ class MyApp(QMainWindow):
 
 
 if __name__ == '__main__':
+    multiprocessing.freeze_support()  # 打包后多进程解析需要
     app = QApplication(sys.argv)
     ex = MyApp()
     sys.exit(app.exec_())
@@ -0,0 +1,153 @@
+import numpy as np
+
+# 平滑方法 -> 界面显示的名称
+SMOOTH_METHODS = {'moving_average': '滑动平均', 'savgol': 'Savitzky-Golay', 'exponential': '指数平滑'}
+# 默认平滑窗口(帧数)
+SMOOTH_WINDOW = 21
+# Savitzky-Golay 拟合多项式的阶数, 窗口不足时自动降低
+SAVGOL_ORDER = 3
+# 指数平滑分块计算时块内权重的最大比值, 保证不溢出
+EXPONENTIAL_RANGE = 1e100
+
+
+def _check_window(window) -> int:
+    window = int(window)
+    if window < 1:
+        raise ValueError("平滑窗口应为正整数")
+    return window
+
+
+def _broadcast(array: np.ndarray, ndim: int) -> np.ndarray:
+    # 沿帧方向的一维数组扩展到与数值矩阵相同的维数
+    return array.reshape((-1,) + (1,) * (ndim - 1))
+
+
+def moving_average(values: np.ndarray, window=SMOOTH_WINDOW, axis=0) -> np.ndarray:
+    """
+    居中滑动平均, 用累加和一次算出全部列, 两端窗口不完整时只对窗口内已有的帧平均
+    :param values: 数值矩阵, 沿axis为帧
+    :param window: 窗口帧数
+    :param axis: 帧所在的维
+    :return: 与values形状相同的平滑结果
+    """
+    window = _check_window(window)
+    values = np.moveaxis(np.asarray(values, dtype=np.float64), axis, 0)
+    n = len(values)
+    cumsum = np.concatenate([np.zeros((1,) + values.shape[1:]), np.cumsum(values, axis=0)])
+    frames = np.arange(n)
+    lower = np.clip(frames - window // 2, 0, n)
+    upper = np.clip(frames - window // 2 + window, 0, n)
+    result = (cumsum[upper] - cumsum[lower]) / _broadcast(upper - lower, values.ndim)
+    return np.moveaxis(result, 0, axis)
+
+
+def savgol_coefficients(window: int, order: int) -> np.ndarray:
+    """
+    Savitzky-Golay 系数: 对窗口内各帧做order阶最小二乘多项式拟合, 再取拟合值
+    :return: window × window, 第i行为用整个窗口估计窗口内第i帧的权重
+    """
+    positions = np.arange(window) - window // 2
+    vander = np.vander(positions, order + 1, increasing=True).astype(np.float64)
+    return vander @ np.linalg.pinv(vander)
+
+
+def savgol(values: np.ndarray, window=SMOOTH_WINDOW, order=SAVGOL_ORDER, axis=0) -> np.ndarray:
+    """
+    Savitzky-Golay 平滑, 比滑动平均更好地保留峰的高度和位置.
+    中间各帧用中心系数对整个矩阵做卷积, 循环只在窗口的各个位置上;
+    两端与 scipy.signal.savgol_filter 的 interp 模式一致, 用首尾窗口的拟合多项式取值
+    :param values: 数值矩阵, 沿axis为帧
+    :param window: 窗口帧数, 偶数时加1, 超过帧数时缩小
+    :param order: 多项式阶数, 不小于窗口时降低为窗口减1
+    :param axis: 帧所在的维
+    :return: 与values形状相同的平滑结果
+    """
+    window = _check_window(window) | 1
+    values = np.moveaxis(np.asarray(values, dtype=np.float64), axis, 0)
+    n = len(values)
+    if n < window:
+        window = n if n % 2 else n - 1
+    if window <= 1:
+        return np.moveaxis(values.copy(), 0, axis)
+    order = min(int(order), window - 1)
+    coefficients = savgol_coefficients(window, order)
+    half = window // 2
+
+    result = np.empty_like(values)
+    interior = result[half:n - half]
+    interior[...] = 0
+    term = np.empty_like(interior)
+    for k, weight in enumerate(coefficients[half]):
+        interior += np.multiply(values[k:n - window + 1 + k], weight, out=term)
+    result[:half] = np.tensordot(coefficients[:half], values[:window], axes=1)
+    result[n - half:] = np.tensordot(coefficients[half + 1:], values[n - window:], axes=1)
+    return np.moveaxis(result, 0, axis)
+
+
+def exponential(values: np.ndarray, window=SMOOTH_WINDOW, axis=0) -> np.ndarray:
+    """
+    指数平滑 y[t] = (1 - alpha) * y[t-1] + alpha * x[t], alpha = 2 / (window + 1),
+    与 pandas 的 ewm(span=window, adjust=False) 一致.
+    递推按块展开为累加和, 块长度保证块内权重不溢出, 循环次数只与帧数和窗口有关
+    :param values: 数值矩阵, 沿axis为帧
+    :param window: 等效窗口帧数
+    :param axis: 帧所在的维
+    :return: 与values形状相同的平滑结果
+    """
+    window = _check_window(window)
+    values = np.moveaxis(np.asarray(values, dtype=np.float64), axis, 0)
+    alpha = 2 / (window + 1)
+    decay = 1 - alpha
+    if decay == 0 or len(values) == 0:
+        return np.moveaxis(values.copy(), 0, axis)
+    block = max(1, int(np.log(EXPONENTIAL_RANGE) / -np.log(decay)))
+
+    result = np.empty_like(values)
+    previous = values[0]  # 使第一帧的结果等于其本身
+    for start in range(0, len(values), block):
+        chunk = values[start:start + block]
+        # y[j] = decay^(j+1) * previous + alpha * decay^j * sum(decay^-i * x[i], i <= j)
+        weights = _broadcast(decay ** np.arange(len(chunk)), values.ndim)
+        chunk_result = result[start:start + block]
+        chunk_result[...] = alpha * weights * np.cumsum(chunk / weights, axis=0) + decay * weights * previous
+        previous = chunk_result[-1]
+    return np.moveaxis(result, 0, axis)
+
+
+def derivative(values: np.ndarray, x: np.ndarray, axis=0) -> np.ndarray:
+    """
+    对x的变化速率, 中间各帧用中心差分, 两端用单侧差分, 允许x不等间距
+    :param values: 数值矩阵, 沿axis为帧
+    :param x: 各帧的时间或温度
+    :param axis: 帧所在的维
+    :return: 与values形状相同的速率
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if values.shape[axis] < 2:
+        return np.zeros_like(values)
+    return np.gradient(values, np.asarray(x, dtype=np.float64), axis=axis)
+
+
+def transform(values: np.ndarray, x: np.ndarray, smooth=None, window=SMOOTH_WINDOW, rate=False,
+              axis=0) -> np.ndarray:
+    """
+    先平滑再求变化速率, 全部列一次计算
+    :param values: 数值矩阵, 沿axis为帧
+    :param x: 各帧的时间或温度
+    :param smooth: 平滑方法, 见 SMOOTH_METHODS, None为不平滑
+    :param window: 平滑窗口帧数
+    :param rate: 是否求对x的变化速率
+    :param axis: 帧所在的维
+    :return: 与values形状相同的结果
+    """
+    if smooth == 'moving_average':
+        values = moving_average(values, window, axis)
+    elif smooth == 'savgol':
+        values = savgol(values, window, SAVGOL_ORDER, axis)
+    elif smooth == 'exponential':
+        values = exponential(values, window, axis)
+    elif smooth is not None:
+        raise ValueError(f"未知的平滑方法: {smooth}, 可选 {', '.join(SMOOTH_METHODS)}")
+    if rate:
+        values = derivative(values, x, axis)
+    return values
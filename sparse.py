@@ -0,0 +1,160 @@
+from typing import Dict, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+class SparseCounts:
+    """
+    按物种(列)压缩存储的 帧 × 物种 数量矩阵(CSC格式), 只保存非零值.
+    第j个物种的非零值为 data[indptr[j]:indptr[j + 1]], 所在帧为 indices 的同一区间.
+    """
+
+    def __init__(self, indptr: np.ndarray, indices: np.ndarray, data: np.ndarray, shape: Tuple[int, int]):
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.shape = (int(shape[0]), int(shape[1]))
+        self._cols = None
+
+    @classmethod
+    def from_coo(cls, rows: np.ndarray, cols: np.ndarray, values: np.ndarray, shape: Tuple[int, int]):
+        """
+        由 (帧, 物种, 数量) 三元组构建
+        """
+        order = np.lexsort((rows, cols))
+        indptr = np.zeros(shape[1] + 1, dtype=np.int64)
+        np.cumsum(np.bincount(cols, minlength=shape[1]), out=indptr[1:])
+        return cls(indptr, rows[order].astype(np.int32), values[order], shape)
+
+    @classmethod
+    def from_dense(cls, counts: np.ndarray):
+        rows, cols = np.nonzero(counts)
+        return cls.from_coo(rows, cols, counts[rows, cols], counts.shape)
+
+    def to_coo(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        return self.indices.astype(np.int64), self._column_ids(), self.data
+
+    def _column_ids(self) -> np.ndarray:
+        # 每个非零值所属的物种
+        if self._cols is None:
+            self._cols = np.repeat(np.arange(self.shape[1]), np.diff(self.indptr))
+        return self._cols
+
+    @property
+    def dtype(self):
+        return self.data.dtype
+
+    @property
+    def nnz(self) -> int:
+        return len(self.data)
+
+    @property
+    def nbytes(self) -> int:
+        return self.indptr.nbytes + self.indices.nbytes + self.data.nbytes
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, key):
+        # counts[i]: 第i帧(稠密); counts[a:b]: 帧区间(稀疏); counts[:, ids]: 指定物种(稠密)
+        if isinstance(key, tuple):
+            rows, cols = key
+            if rows != slice(None):
+                raise IndexError("只支持按物种取整列")
+            return self.columns(np.atleast_1d(cols))
+        if isinstance(key, slice):
+            return self.row_slice(key)
+        return self.row(int(key))
+
+    def column(self, j: int) -> np.ndarray:
+        result = np.zeros(self.shape[0], dtype=self.dtype)
+        start, end = self.indptr[j], self.indptr[j + 1]
+        result[self.indices[start:end]] = self.data[start:end]
+        return result
+
+    def columns(self, ids) -> np.ndarray:
+        """
+        只将指定物种转为稠密矩阵
+        """
+        result = np.zeros((self.shape[0], len(ids)), dtype=self.dtype)
+        for k, j in enumerate(ids):
+            start, end = self.indptr[j], self.indptr[j + 1]
+            result[self.indices[start:end], k] = self.data[start:end]
+        return result
+
+    def row(self, i: int) -> np.ndarray:
+        if i < 0:
+            i += self.shape[0]
+        result = np.zeros(self.shape[1], dtype=self.dtype)
+        hit = self.indices == i
+        result[self._column_ids()[hit]] = self.data[hit]
+        return result
+
+    def row_slice(self, key: slice) -> 'SparseCounts':
+        start, stop, step = key.indices(self.shape[0])
+        if step != 1:
+            raise IndexError("只支持连续的帧区间")
+        if start == 0 and stop == self.shape[0]:
+            return self
+        rows, cols, values = self.to_coo()
+        keep = (rows >= start) & (rows < stop)
+        return SparseCounts.from_coo(rows[keep] - start, cols[keep], values[keep], (stop - start, self.shape[1]))
+
+    def __matmul__(self, other: np.ndarray) -> np.ndarray:
+        """
+        与稠密的 物种 × k 矩阵(或长度为物种数的向量)相乘, 得到 帧 × k 的稠密结果
+        """
+        other = np.asarray(other)
+        cols = self._column_ids()
+        if other.ndim == 1:
+            return np.bincount(self.indices, weights=self.data * other[cols], minlength=self.shape[0])
+        result = np.empty((self.shape[0], other.shape[1]), dtype=np.result_type(self.dtype, other.dtype))
+        for k in range(other.shape[1]):
+            result[:, k] = np.bincount(self.indices, weights=self.data * other[cols, k], minlength=self.shape[0])
+        return result
+
+    def max(self, axis=0) -> np.ndarray:
+        """
+        各物种的最大值
+        """
+        if axis != 0:
+            raise ValueError("只支持按物种(axis=0)归约")
+        result = np.zeros(self.shape[1], dtype=self.dtype)
+        nonempty = np.diff(self.indptr) > 0
+        if self.nnz:
+            result[nonempty] = np.maximum.reduceat(self.data, self.indptr[:-1][nonempty])
+        return result
+
+    def sum(self, axis=0, dtype=np.int64) -> np.ndarray:
+        """
+        各物种的总和
+        """
+        if axis != 0:
+            raise ValueError("只支持按物种(axis=0)归约")
+        result = np.zeros(self.shape[1], dtype=dtype)
+        nonempty = np.diff(self.indptr) > 0
+        if self.nnz:
+            result[nonempty] = np.add.reduceat(self.data, self.indptr[:-1][nonempty], dtype=dtype)
+        return result
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        return {'indptr': self.indptr, 'indices': self.indices, 'data': self.data, 'shape': np.array(self.shape)}
+
+    def to_frame(self, columns) -> pd.DataFrame:
+        """
+        转为各列为 SparseDtype 的DataFrame, 不展开为稠密矩阵.
+        只使用 SparseArray 的公开构造方式(不依赖 pandas 私有的 IntIndex): 逐列把非零值写入同一个稠密缓冲区,
+        构造后再清零, 临时内存只有一列
+        """
+        length = self.shape[0]
+        dtype = pd.SparseDtype(self.dtype, 0)
+        buffer = np.zeros(length, dtype=self.dtype)
+        data = dict()
+        for j, name in enumerate(columns):
+            start, end = self.indptr[j], self.indptr[j + 1]
+            rows = self.indices[start:end]
+            buffer[rows] = self.data[start:end]
+            data[name] = pd.arrays.SparseArray(buffer, fill_value=0, dtype=dtype)  # 只复制非零值
+            buffer[rows] = 0
+        return pd.DataFrame(data, index=pd.RangeIndex(length))
@@ -0,0 +1,91 @@
+import os
+import threading
+from collections import OrderedDict
+
+from data import TableData
+
+# 默认内存预算(MB), 可通过环境变量 QTDATAANALYSE_STORE_BUDGET_MB 修改
+DEFAULT_BUDGET_MB = 2048
+
+
+class DataStore:
+    """
+    进程内共享的已加载数据, 按 (路径, 步长, 存储方式, 时间范围, 帧间隔, 文件大小, 修改时间) 索引.
+    缓存中的TableData不直接交给调用方, 每次返回共享底层数组的浅拷贝;
+    超出内存预算时按最近最少使用淘汰.
+    """
+
+    def __init__(self, budget_mb=None):
+        if budget_mb is None:
+            budget_mb = float(os.environ.get('QTDATAANALYSE_STORE_BUDGET_MB', DEFAULT_BUDGET_MB))
+        self.budget = int(budget_mb * (1 << 20))
+        self._tables: OrderedDict[tuple, TableData] = OrderedDict()
+        self._sizes: dict[tuple, int] = dict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(file_path, footstep, sparse=False, time_range=None, stride=1) -> tuple:
+        stat = os.stat(file_path)
+        time_range = None if time_range is None else tuple(time_range)
+        return (os.path.abspath(file_path), float(footstep), bool(sparse), time_range, int(stride), stat.st_size,
+                stat.st_mtime_ns)
+
+    @property
+    def used(self) -> int:
+        return sum(self._sizes.values())
+
+    def get(self, file_path, footstep=1, sparse=False, progress=None, time_range=None, stride=1) -> TableData:
+        """
+        获取数据, 未加载或文件已变化时重新加载, 可在多个线程中调用
+        :param file_path: 文件路径
+        :param footstep: 步长
+        :param sparse: 是否以稀疏矩阵存储物种数量
+        :param progress: 解析进度回调, 见 data.parse_file
+        :param time_range: 只读取该时间范围(ps)内的帧, 见 TableData
+        :param stride: 帧间隔
+        :return: 可自由修改的TableData浅拷贝
+        """
+        key = self.key(file_path, footstep, sparse, time_range, stride)
+        with self._lock:
+            table = self._tables.get(key)
+            if table is not None:
+                self._tables.move_to_end(key)
+                return table.clone()
+
+        # 加载时不持有锁, 不阻塞其他文件的读取
+        table = TableData(file_path, footstep, sparse=sparse, progress=progress, time_range=time_range, stride=stride)
+        with self._lock:
+            if key in self._tables:  # 其他线程已加载同一文件
+                return self._tables[key].clone()
+            # 同一文件、同一范围的旧版本已无用, 直接丢弃
+            for old in [k for k in self._tables if k[:5] == key[:5]]:
+                self._discard(old)
+            self._tables[key] = table
+            self._sizes[key] = int(table.df.memory_usage(index=False).sum())
+            self._evict(keep=key)
+            return table.clone()
+
+    def set_budget(self, budget_mb):
+        with self._lock:
+            self.budget = int(budget_mb * (1 << 20))
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._tables.clear()
+            self._sizes.clear()
+
+    def _discard(self, key):
+        del self._tables[key]
+        del self._sizes[key]
+
+    def _evict(self, keep=None):
+        for key in list(self._tables):
+            if self.used <= self.budget:
+                break
+            if key != keep:
+                self._discard(key)
+
+
+# 所有页面共用的数据缓存
+data_store = DataStore()
@@ -0,0 +1,109 @@
+import argparse
+import sys
+from typing import List
+
+import numpy as np
+
+# 常见的无机小分子, 不够时按元素组合生成
+INORGANIC_SPECIES = ['H2O', 'H2', 'O2', 'CO', 'CO2', 'N2', 'NO', 'NO2', 'N2O', 'NH3', 'H2S', 'SO2', 'SO3', 'PH3', 'H',
+                     'O', 'OH', 'HO2', 'H2O2', 'N', 'S', 'P']
+# 杂原子及其在含杂原子有机物中的相对比例
+HETERO_ELEMENTS = ['O', 'N', 'S', 'P']
+HETERO_WEIGHTS = [0.55, 0.25, 0.15, 0.05]
+
+
+def formula(counts: dict) -> str:
+    """
+    按 C H O N S P 的顺序拼接分子式, 原子数为1时省略数字, 与species文件一致
+    """
+    return ''.join(element + (str(n) if n > 1 else '') for element, n in counts.items() if n > 0)
+
+
+def species_names(count: int, rng: np.random.Generator, max_carbon=120, hetero=0.3, inorganic=0.1) -> List[str]:
+    """
+    生成互不相同的物种名
+    :param count: 物种数
+    :param rng: 随机数生成器
+    :param max_carbon: 最大碳数, 碳数按对数均匀分布, 覆盖 C1-C4 到 C100 以上各分类
+    :param hetero: 有机物中含 O/N/S/P 的比例
+    :param inorganic: 无机物的比例
+    :return: 物种名
+    """
+    names = dict()
+    inorganic_count = int(round(count * inorganic))
+    for name in INORGANIC_SPECIES[:inorganic_count]:
+        names[name] = None
+    while len(names) < inorganic_count:
+        counts = {element: int(rng.integers(0, 4)) for element in ['H'] + HETERO_ELEMENTS}
+        if sum(counts.values()) > 1:
+            names.setdefault(formula(counts), None)
+
+    while len(names) < count:
+        carbon = int(np.exp(rng.uniform(0, np.log(max_carbon + 1))))
+        counts = {'C': carbon, 'H': int(rng.integers(max(1, carbon // 2), 2 * carbon + 3))}
+        if rng.random() < hetero:
+            for element in rng.choice(HETERO_ELEMENTS, size=rng.integers(1, 3), replace=False, p=HETERO_WEIGHTS):
+                counts[element] = int(rng.integers(1, 4))
+        counts = {element: counts.get(element, 0) for element in ['C', 'H'] + HETERO_ELEMENTS}
+        names.setdefault(formula(counts), None)
+    return list(names)
+
+
+def generate(path: str, frames=1000, species=50, sparsity=0.5, churn=0.05, max_carbon=120, hetero=0.3,
+             inorganic=0.1, interval=100, seed=0):
+    """
+    生成与LAMMPS ReaxFF species输出格式一致的合成文件, 相同参数和种子生成的文件完全相同
+    :param path: 输出路径
+    :param frames: 帧数
+    :param species: 物种总数
+    :param sparsity: 每帧中不出现的物种比例
+    :param churn: 每帧物种组成(表头)发生变化的概率, 变化时替换约5%的物种
+    :param max_carbon: 最大碳数
+    :param hetero: 有机物中含 O/N/S/P 的比例
+    :param inorganic: 无机物的比例
+    :param interval: 相邻两帧的时间步间隔
+    :param seed: 随机种子
+    """
+    if not 0 <= sparsity < 1:
+        raise ValueError("sparsity 应在 [0, 1) 之间")
+    rng = np.random.default_rng(seed)
+    names = np.array(species_names(species, rng, max_carbon, hetero, inorganic), dtype=object)
+    # 每个物种的基础数量及随时间的变化趋势, 大分子逐渐分解, 小分子逐渐生成
+    base = rng.lognormal(1.5, 1.2, size=species)
+    trend = rng.uniform(-2, 2, size=species)
+
+    present = list(rng.permutation(species)[:max(1, int(round(species * (1 - sparsity))))])
+    swap = max(1, len(present) // 20)
+    with open(path, 'w') as file:
+        for frame in range(frames):
+            if frame and len(present) < species and rng.random() < churn:
+                absent = np.setdiff1d(np.arange(species), present)
+                removed = set(rng.choice(len(present), size=min(swap, len(absent)), replace=False).tolist())
+                present = [idx for i, idx in enumerate(present) if i not in removed]
+                present.extend(rng.choice(absent, size=len(removed), replace=False).tolist())
+            ids = np.array(present)
+            counts = rng.poisson(base[ids] * np.exp(trend[ids] * frame / frames)) + 1
+            file.write('# Timestep     No_Moles     No_Specs     ' + '\t'.join(names[ids]) + '\t\n')
+            file.write(f'{(frame + 1) * interval}         {counts.sum()}          {len(ids)}\t '
+                       + '\t '.join(map(str, counts.tolist())) + '\t\n')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="生成用于测试和性能基准的合成species文件")
+    parser.add_argument('output', help="输出文件路径")
+    parser.add_argument('-n', '--frames', type=int, default=1000, help="帧数")
+    parser.add_argument('-s', '--species', type=int, default=50, help="物种总数")
+    parser.add_argument('--sparsity', type=float, default=0.5, help="每帧中不出现的物种比例")
+    parser.add_argument('--churn', type=float, default=0.05, help="每帧物种组成发生变化的概率")
+    parser.add_argument('--max-carbon', type=int, default=120, help="最大碳数")
+    parser.add_argument('--hetero', type=float, default=0.3, help="有机物中含 O/N/S/P 的比例")
+    parser.add_argument('--inorganic', type=float, default=0.1, help="无机物的比例")
+    parser.add_argument('--seed', type=int, default=0, help="随机种子")
+    args = parser.parse_args(argv)
+    generate(args.output, args.frames, args.species, args.sparsity, args.churn, args.max_carbon, args.hetero,
+             args.inorganic, seed=args.seed)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())